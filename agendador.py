@@ -0,0 +1,231 @@
+# Caminho: Automação de Relatórios Empresariais/agendador.py
+
+import os
+import time
+import logging
+import datetime
+import multiprocessing
+from multiprocessing.connection import wait
+import yaml
+
+from config import BASE_DIR, EMAIL_DESTINATARIOS, ORCAMENTO_MEMORIA_MB, MAX_TRABALHADORES
+from utils import setup_logging, carregar_definicoes_relatorios, pico_memoria_processo
+from pipeline_relatorios import montar_caminhos_entrada, executar_relatorios, enviar_relatorios_consolidados
+from explicar_relatorio import estimar_recursos_pacote
+
+logger = logging.getLogger(__name__)
+
+def _resolver_caminho(caminho: str) -> str:
+    """Caminhos relativos no YAML de pacotes são relativos à pasta do projeto."""
+    return caminho if os.path.isabs(caminho) else os.path.join(BASE_DIR, caminho)
+
+def carregar_pacotes(caminho_pacotes: str) -> list[dict]:
+    """
+    Carrega a lista de pacotes de relatórios do YAML. Cada pacote informa suas definições,
+    pasta de dados, pasta de saída, destinatários e, opcionalmente, prioridade e prazo.
+    """
+    if not os.path.exists(caminho_pacotes):
+        logger.error(f"Arquivo de pacotes de relatórios não encontrado: {caminho_pacotes}")
+        raise FileNotFoundError(f"Arquivo de pacotes de relatórios não encontrado: {caminho_pacotes}")
+
+    with open(caminho_pacotes, 'r', encoding='utf-8') as file:
+        conteudo = yaml.safe_load(file) or {}
+
+    pacotes_yaml = conteudo.get('pacotes')
+    if not pacotes_yaml or not isinstance(pacotes_yaml, list):
+        raise ValueError(f"A seção 'pacotes' está ausente ou malformada em {caminho_pacotes}.")
+
+    pacotes = []
+    nomes_vistos = set()
+    for pacote_yaml in pacotes_yaml:
+        nome = pacote_yaml.get('nome')
+        campos_ausentes = [campo for campo in ('nome', 'definicoes', 'dados', 'relatorios') if not pacote_yaml.get(campo)]
+        if campos_ausentes:
+            raise ValueError(f"Pacote '{nome}' sem os campos obrigatórios: {campos_ausentes}.")
+        if nome in nomes_vistos:
+            raise ValueError(f"Pacote '{nome}' definido mais de uma vez em {caminho_pacotes}.")
+        nomes_vistos.add(nome)
+
+        prazo = pacote_yaml.get('prazo')
+        if prazo is not None and not isinstance(prazo, datetime.datetime):
+            # O YAML já converte datas ISO completas; textos como "2025-07-05 08:00" são convertidos aqui
+            prazo = datetime.datetime.fromisoformat(str(prazo))
+
+        pacotes.append({
+            'nome': nome,
+            'definicoes': _resolver_caminho(pacote_yaml['definicoes']),
+            'dados': _resolver_caminho(pacote_yaml['dados']),
+            'relatorios': _resolver_caminho(pacote_yaml['relatorios']),
+            'destinatarios': pacote_yaml.get('destinatarios') or EMAIL_DESTINATARIOS,
+            'prioridade': int(pacote_yaml.get('prioridade', 0)),
+            'prazo': prazo,
+            'enviar_email': pacote_yaml.get('enviar_email', True),
+        })
+
+    logger.info(f"{len(pacotes)} pacote(s) de relatórios carregado(s) de: {caminho_pacotes}")
+    return pacotes
+
+def _executar_pacote(pacote: dict, data_referencia: datetime.date, conexao) -> None:
+    """
+    Executado em um processo próprio: gera (e opcionalmente envia) os relatórios de um pacote.
+    Qualquer erro é devolvido pela conexão, sem afetar os demais pacotes.
+    """
+    setup_logging() # Necessário quando o processo é criado com 'spawn' (Windows/macOS)
+    try:
+        definicoes_relatorios = carregar_definicoes_relatorios(pacote['definicoes'])
+        caminhos_arquivos_entrada = montar_caminhos_entrada(pacote['dados'], data_referencia)
+        resumo = {}
+        caminhos_relatorios = executar_relatorios(definicoes_relatorios, caminhos_arquivos_entrada, pacote['relatorios'], data_referencia,
+                                                  resumo=resumo, nome_pacote=pacote['nome'])
+        if pacote['enviar_email']:
+            enviar_relatorios_consolidados(caminhos_relatorios, pacote['destinatarios'], data_referencia)
+        conexao.send({'status': 'sucesso', 'relatorios': caminhos_relatorios, 'validacao': resumo.get('validacao', {}),
+                      'pico_memoria_bytes': pico_memoria_processo()})
+    except Exception as e:
+        logger.error(f"Erro ao executar o pacote '{pacote['nome']}': {e}", exc_info=True)
+        conexao.send({'status': 'falha', 'erro': str(e)})
+    finally:
+        conexao.close()
+
+def _prazo_em_risco(pacote: dict, agora: datetime.datetime) -> bool:
+    """O pacote tem prazo e, iniciando agora, terminaria (pela duração estimada) no prazo ou depois dele."""
+    return bool(pacote['prazo']) and agora + datetime.timedelta(seconds=pacote['segundos_estimados']) >= pacote['prazo']
+
+def _ordem_execucao(pacote: dict, agora: datetime.datetime):
+    """
+    Pacotes com prazo em risco (ou já vencido) primeiro, pelo prazo mais próximo; os demais por
+    maior prioridade e, entre prioridades iguais, pelo prazo mais próximo. Recalculada a cada
+    despacho, pois um pacote passa à frente à medida que o seu prazo se aproxima.
+    """
+    if _prazo_em_risco(pacote, agora):
+        return (0, pacote['prazo'], -pacote['prioridade'])
+    return (1, -pacote['prioridade'], pacote['prazo'] or datetime.datetime.max)
+
+def _reserva_cabeca_fila(cabeca: dict, em_execucao: dict, orcamento_memoria_bytes: int, memoria_em_uso: int) -> tuple[float, int]:
+    """
+    Reserva de memória para o primeiro pacote da fila quando ele ainda não cabe no orçamento.
+    Pelas durações estimadas dos pacotes em execução, retorna o instante (em perf_counter) em
+    que memória suficiente estará livre para ele e a memória que sobrará nesse instante além
+    da sua. Um pacote maior que o orçamento só inicia sozinho, após o fim de todos os demais.
+    """
+    memoria_livre = orcamento_memoria_bytes - memoria_em_uso
+    instante_reserva = time.perf_counter()
+    termino_previsto = sorted(
+        (inicio + pacote['segundos_estimados'], pacote['memoria_estimada'])
+        for _, _, pacote, inicio in em_execucao.values()
+    )
+    for termino, memoria in termino_previsto:
+        if memoria_livre >= cabeca['memoria_estimada']:
+            break
+        memoria_livre += memoria
+        instante_reserva = max(instante_reserva, termino)
+    return instante_reserva, max(0, memoria_livre - cabeca['memoria_estimada'])
+
+def executar_agendamento(
+    pacotes: list[dict],
+    data_referencia: datetime.date,
+    orcamento_memoria_bytes: int = None,
+    max_trabalhadores: int = None
+) -> dict[str, dict]:
+    """
+    Executa os pacotes em processos separados respeitando um orçamento global de memória
+    e um limite de trabalhadores. Um pacote só inicia se a soma das memórias estimadas dos
+    pacotes em execução couber no orçamento (um pacote maior que o orçamento roda sozinho).
+    Quando o primeiro da fila não cabe, pacotes menores só passam à frente sem atrasar o
+    início previsto dele.
+    Retorna {nome_pacote: resultado}, com 'status' igual a 'sucesso' ou 'falha'.
+    """
+    orcamento_memoria_bytes = orcamento_memoria_bytes or ORCAMENTO_MEMORIA_MB * 1024 * 1024
+    max_trabalhadores = max(1, max_trabalhadores or MAX_TRABALHADORES)
+    resultados = {}
+
+    # 1. Estimar o pico de memória de cada pacote (apenas cabeçalhos e contagens de linhas são lidos),
+    #    calibrado com os picos de RSS medidos nas execuções anteriores
+    fila = []
+    for pacote in pacotes:
+        try:
+            definicoes_relatorios = carregar_definicoes_relatorios(pacote['definicoes'])
+            caminhos_arquivos_entrada = montar_caminhos_entrada(pacote['dados'], data_referencia)
+            recursos = estimar_recursos_pacote(definicoes_relatorios, caminhos_arquivos_entrada, pacote['nome'])
+            pacote = {**pacote, 'memoria_estimada': recursos['memoria_bytes'], 'segundos_estimados': recursos['segundos']}
+        except Exception as e:
+            logger.error(f"Pacote '{pacote['nome']}' não pôde ser preparado e não será executado: {e}", exc_info=True)
+            resultados[pacote['nome']] = {'status': 'falha', 'erro': str(e)}
+            continue
+        logger.info(f"Pacote '{pacote['nome']}': memória estimada de {pacote['memoria_estimada'] / (1024 * 1024):.1f} MB, "
+                    f"duração estimada de {pacote['segundos_estimados']:.1f} s.")
+        fila.append(pacote)
+
+    # 2. Despachar os pacotes conforme memória e trabalhadores ficam disponíveis
+    contexto = multiprocessing.get_context()
+    em_execucao = {} # sentinel do processo -> (processo, conexão, pacote, início)
+    memoria_em_uso = 0
+    while fila or em_execucao:
+        agora = datetime.datetime.now()
+        fila.sort(key=lambda pacote: _ordem_execucao(pacote, agora))
+        reserva = None # (instante, memória que sobra) reservados para o primeiro pacote que não coube
+        for pacote in list(fila):
+            if len(em_execucao) >= max_trabalhadores:
+                break
+            if em_execucao and memoria_em_uso + pacote['memoria_estimada'] > orcamento_memoria_bytes:
+                if reserva is None:
+                    reserva = _reserva_cabeca_fila(pacote, em_execucao, orcamento_memoria_bytes, memoria_em_uso)
+                    logger.info(f"Pacote '{pacote['nome']}' aguardando memória livre; pacotes seguintes só serão antecipados "
+                                f"se não atrasarem o seu início.")
+                continue
+            if reserva is not None:
+                # Um pacote atrás na fila só é antecipado se terminar antes do início reservado para o
+                # primeiro que aguarda, ou se couber na memória que sobrará quando ele iniciar
+                instante_reserva, memoria_sobrando = reserva
+                if time.perf_counter() + pacote['segundos_estimados'] > instante_reserva:
+                    if pacote['memoria_estimada'] > memoria_sobrando:
+                        continue
+                    reserva = (instante_reserva, memoria_sobrando - pacote['memoria_estimada'])
+
+            if pacote['prazo'] and agora > pacote['prazo']:
+                logger.warning(f"Pacote '{pacote['nome']}' iniciando após o prazo ({pacote['prazo']}).")
+            elif _prazo_em_risco(pacote, agora):
+                logger.warning(f"Pacote '{pacote['nome']}' iniciando com o prazo em risco ({pacote['prazo']}, "
+                               f"duração estimada de {pacote['segundos_estimados']:.1f} s).")
+            conexao_leitura, conexao_escrita = contexto.Pipe(duplex=False)
+            processo = contexto.Process(
+                target=_executar_pacote,
+                args=(pacote, data_referencia, conexao_escrita),
+                name=f"pacote-{pacote['nome']}"
+            )
+            processo.start()
+            conexao_escrita.close() # O processo filho mantém sua própria cópia
+            em_execucao[processo.sentinel] = (processo, conexao_leitura, pacote, time.perf_counter())
+            memoria_em_uso += pacote['memoria_estimada']
+            fila.remove(pacote)
+            logger.info(f"Pacote '{pacote['nome']}' iniciado (prioridade {pacote['prioridade']}, "
+                        f"memória em uso estimada: {memoria_em_uso / (1024 * 1024):.1f} MB).")
+
+        for sentinel in wait(list(em_execucao)):
+            processo, conexao_leitura, pacote, inicio = em_execucao.pop(sentinel)
+            processo.join()
+            memoria_em_uso -= pacote['memoria_estimada']
+
+            # Se o processo morreu sem responder (ex.: falta de memória), registramos o código de saída
+            if conexao_leitura.poll():
+                resultado = conexao_leitura.recv()
+            else:
+                resultado = {'status': 'falha', 'erro': f"Processo encerrado sem resposta (código de saída {processo.exitcode})."}
+            conexao_leitura.close()
+
+            resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+            if pacote['prazo']:
+                resultado['prazo_cumprido'] = datetime.datetime.now() <= pacote['prazo']
+                if not resultado['prazo_cumprido']:
+                    logger.warning(f"Pacote '{pacote['nome']}' concluído após o prazo ({pacote['prazo']}).")
+            resultados[pacote['nome']] = resultado
+
+            if resultado['status'] == 'sucesso':
+                logger.info(f"Pacote '{pacote['nome']}' concluído em {resultado['segundos']} s com {len(resultado['relatorios'])} relatório(s).")
+                if resultado.get('pico_memoria_bytes'):
+                    logger.info(f"Pacote '{pacote['nome']}': pico de memória medido de {resultado['pico_memoria_bytes'] / (1024 * 1024):.1f} MB "
+                                f"(estimado: {pacote['memoria_estimada'] / (1024 * 1024):.1f} MB).")
+            else:
+                logger.error(f"Pacote '{pacote['nome']}' falhou: {resultado['erro']}")
+
+    return resultados
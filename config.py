@@ -13,6 +13,12 @@ CAMINHO_RELATORIOS = os.path.join(BASE_DIR, 'relatorios') # Pasta onde os relat
 # Caminho para o arquivo de definições de relatórios (NOVO)
 CAMINHO_DEFINICOES_RELATORIOS = os.path.join(BASE_DIR, 'config_reports', 'report_definitions.yaml') 
 
+# --- Agendador de Pacotes de Relatórios (python main.py --pacotes) ---
+# Cada pacote tem suas próprias definições, pasta de dados, pasta de saída e destinatários.
+CAMINHO_PACOTES_RELATORIOS = os.path.join(BASE_DIR, 'config_reports', 'pacotes_relatorios.yaml')
+ORCAMENTO_MEMORIA_MB = int(os.getenv('ORCAMENTO_MEMORIA_MB', '4096')) # Memória total que os pacotes em execução podem ocupar juntos
+MAX_TRABALHADORES = int(os.getenv('MAX_TRABALHADORES', '2')) # Máximo de pacotes executando ao mesmo tempo (um processo por pacote)
+
 # --- Mapeamento de Colunas Flexíveis (manter e personalizar) ---
 # ATENÇÃO: Ajuste estes aliases para os NOMES REAIS (e em minúsculas, recomendado) das colunas nas SUAS planilhas!
 COLUNAS_TRANSACOES = {
@@ -27,6 +33,16 @@ COLUNAS_CADASTROS = {
     'segmento': ['Segmento', 'Classificacao Cliente', 'Customer Segment']
 }
 
+# --- Regras de Validação dos Dados de Entrada ---
+# Linhas com 'cliente', 'valor' ou 'data' ausentes ou inválidos são sempre rejeitadas.
+# As regras abaixo podem ser desligadas. Linhas rejeitadas vão para a pasta 'quarentena'
+# dentro da pasta de relatórios, com o motivo de cada rejeição.
+REGRAS_VALIDACAO = {
+    'rejeitar_valor_negativo': True,   # 'valor' menor que zero
+    'rejeitar_fora_do_periodo': True,  # 'data' fora do mês processado
+    'rejeitar_cliente_orfao': True,    # 'cliente' das transações inexistente nos cadastros
+}
+
 # --- Configurações de E-mail (globais - podem ser sobrescritas no YAML do relatório) ---
 # É ALTAMENTE RECOMENDADO carregar estas variáveis de ambiente para maior segurança.
 # Se não usar variáveis de ambiente, coloque suas credenciais AQUI para TESTE, mas remova para PROD.
@@ -51,3 +67,7 @@ Equipe de Automação de Relatórios
 LOG_FILE = os.path.join(BASE_DIR, 'logs', 'automacao_relatorios.log')
 LOG_LEVEL = INFO
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# --- Histórico de Execuções (usado para calibrar as estimativas do modo --explicar) ---
+# Cada linha é um JSON com as métricas de um relatório gerado (linhas, memória, tempo).
+CAMINHO_HISTORICO_EXECUCOES = os.path.join(BASE_DIR, 'logs', 'historico_execucoes.jsonl')
@@ -0,0 +1,333 @@
+# Caminho: Automação de Relatórios Empresariais/explicar_relatorio.py
+
+import os
+import json
+import logging
+import statistics
+import datetime
+from openpyxl import load_workbook
+
+from config import CAMINHO_HISTORICO_EXECUCOES
+from processar_dados import MAPEAMENTO_COLUNAS, mapear_colunas_logicas
+from gerar_relatorio import colunas_referenciadas, coluna_juncao, separar_chave_tempo, nome_saida_chave
+
+logger = logging.getLogger(__name__)
+
+# Valores usados enquanto não há execuções registradas no histórico para calibrar as estimativas.
+# As memórias são picos de RSS de cada etapa acima da memória no início dela (leitura do openpyxl e escrita do Excel incluídas).
+MEMORIA_BASE_PADRAO = 80 * 1024 * 1024 # Interpretador + pandas/openpyxl importados, antes de ler os dados
+BYTES_POR_CELULA_CARREGAMENTO_PADRAO = 120 # Leitura com openpyxl e DataFrames resultantes
+BYTES_POR_CELULA_RELATORIO_PADRAO = 350 # Junções, processamento e escrita do Excel (a escrita domina em relatórios detalhados)
+SEGUNDOS_POR_CELULA_RELATORIO_PADRAO = 2e-6 # Junções, agrupamentos e escrita do Excel
+SEGUNDOS_POR_CELULA_CARREGAMENTO_PADRAO = 2e-5 # Leitura do Excel com openpyxl
+
+# Nome usado no histórico para registrar o tempo de carregamento das fontes
+REGISTRO_CARREGAMENTO = '_carregamento'
+
+def ler_metadados_fontes(caminhos_arquivos: dict) -> dict[str, dict]:
+    """
+    Lê apenas o cabeçalho e a contagem de linhas de cada arquivo Excel de entrada,
+    sem carregar os dados. Os nomes das colunas são padronizados com os mesmos
+    aliases usados em processar_dados.
+    Retorna {nome_fonte: {'linhas': int, 'colunas': [str]}}.
+    """
+    metadados = {}
+    for nome_fonte, caminho_arquivo in caminhos_arquivos.items():
+        if not os.path.exists(caminho_arquivo):
+            raise FileNotFoundError(f"Arquivo de dados de {nome_fonte} não encontrado: {caminho_arquivo}")
+
+        workbook = load_workbook(caminho_arquivo, read_only=True)
+        try:
+            planilha = workbook.active
+            cabecalho = next(planilha.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            colunas = [str(col).lower() for col in cabecalho if col is not None]
+            # Em modo read_only, max_row vem da dimensão gravada no arquivo; se ausente, contamos as linhas
+            total_linhas = planilha.max_row
+            if total_linhas is None:
+                total_linhas = sum(1 for _ in planilha.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+        esperado = MAPEAMENTO_COLUNAS.get(nome_fonte)
+        if esperado:
+            mapeamento = mapear_colunas_logicas(colunas, esperado)
+            colunas = [mapeamento.get(col, col) for col in colunas]
+
+        metadados[nome_fonte] = {'linhas': max(total_linhas - 1, 0), 'colunas': colunas}
+        logger.debug(f"Metadados de {nome_fonte}: {metadados[nome_fonte]['linhas']} linhas, colunas {colunas}.")
+    return metadados
+
+def carregar_historico_execucoes() -> list[dict]:
+    """Carrega os registros de execuções anteriores (um JSON por linha)."""
+    if not os.path.exists(CAMINHO_HISTORICO_EXECUCOES):
+        return []
+
+    historico = []
+    with open(CAMINHO_HISTORICO_EXECUCOES, 'r', encoding='utf-8') as file:
+        for numero_linha, linha in enumerate(file, start=1):
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                historico.append(json.loads(linha))
+            except json.JSONDecodeError:
+                logger.warning(f"Linha {numero_linha} inválida no histórico de execuções. Ignorando.")
+    return historico
+
+def registrar_execucao(nome_relatorio: str, metricas: dict, segundos: float, nome_pacote: str = None) -> None:
+    """
+    Acrescenta as métricas de uma execução real ao histórico usado na calibração.
+    Execuções do agendador registram o pacote, pois pacotes diferentes podem ter relatórios
+    com o mesmo nome sobre dados diferentes.
+    """
+    registro = {
+        'relatorio': nome_relatorio,
+        **({'pacote': nome_pacote} if nome_pacote else {}),
+        'data_execucao': datetime.datetime.now().isoformat(timespec='seconds'),
+        'segundos': round(segundos, 4),
+        **metricas,
+    }
+    try:
+        os.makedirs(os.path.dirname(CAMINHO_HISTORICO_EXECUCOES), exist_ok=True)
+        with open(CAMINHO_HISTORICO_EXECUCOES, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    except OSError as e:
+        # O histórico é apenas auxiliar; uma falha aqui não deve interromper a automação
+        logger.warning(f"Não foi possível registrar a execução de '{nome_relatorio}' no histórico: {e}")
+
+def _mediana_razao(registros: list[dict], numerador: str, denominador: str):
+    """Mediana de numerador/denominador nos registros que possuem os dois campos (None se não houver)."""
+    razoes = [r[numerador] / r[denominador] for r in registros if r.get(numerador) is not None and r.get(denominador)]
+    return statistics.median(razoes) if razoes else None
+
+def _com_medicao_memoria(registros: list[dict]) -> list[dict]:
+    """Registros com pico de memória medido (os sem medição ou com pico zero não servem para calibrar)."""
+    return [r for r in registros if r.get('pico_memoria_etapa_bytes')]
+
+def calibrar_estimativas(historico: list[dict], nome_relatorio: str, nome_pacote: str = None) -> dict:
+    """
+    Deriva os coeficientes de estimativa a partir do histórico. Usa as execuções do
+    próprio relatório no mesmo pacote (None = execução fora do agendador) quando existem;
+    caso contrário, os coeficientes por célula de todos os relatórios do pacote ou, se o
+    pacote ainda não tem execuções, de todo o histórico.
+    """
+    do_pacote = [r for r in historico if r.get('pacote') == nome_pacote]
+    carregamentos = [r for r in do_pacote if r.get('relatorio') == REGISTRO_CARREGAMENTO] or \
+                    [r for r in historico if r.get('relatorio') == REGISTRO_CARREGAMENTO]
+    relatorios_pacote = [r for r in do_pacote if r.get('relatorio') != REGISTRO_CARREGAMENTO]
+    todos_relatorios = relatorios_pacote or [r for r in historico if r.get('relatorio') != REGISTRO_CARREGAMENTO]
+    do_relatorio = [r for r in relatorios_pacote if r.get('relatorio') == nome_relatorio]
+    base = do_relatorio or todos_relatorios
+
+    # Memória: pico de cada etapa acima da memória no seu início (ver pipeline_relatorios)
+    base_memoria = _com_medicao_memoria(do_relatorio) or _com_medicao_memoria(todos_relatorios)
+    carregamentos_memoria = _com_medicao_memoria(carregamentos)
+    bytes_por_celula = _mediana_razao(base_memoria, 'pico_memoria_etapa_bytes', 'celulas_apos_juncoes')
+    bytes_por_celula_carregamento = _mediana_razao(carregamentos_memoria, 'pico_memoria_etapa_bytes', 'celulas_entrada')
+    memorias_base = [r['memoria_base_bytes'] for r in carregamentos_memoria if r.get('memoria_base_bytes')]
+    bytes_retidos_por_celula = _mediana_razao(carregamentos_memoria, 'memoria_retida_bytes', 'celulas_entrada')
+    segundos_por_celula = _mediana_razao(base, 'segundos', 'celulas_apos_juncoes')
+    segundos_por_celula_carregamento = _mediana_razao(carregamentos, 'segundos', 'celulas_entrada')
+
+    return {
+        'amostras': len(do_relatorio),
+        # Fatores específicos do relatório só fazem sentido com execuções do próprio relatório
+        'fator_juncoes': _mediana_razao(do_relatorio, 'linhas_apos_juncoes', 'linhas_fonte_principal'),
+        'fator_saida': _mediana_razao(do_relatorio, 'linhas_saida', 'linhas_apos_juncoes'),
+        'bytes_por_celula': bytes_por_celula if bytes_por_celula is not None else BYTES_POR_CELULA_RELATORIO_PADRAO,
+        'bytes_por_celula_carregamento': bytes_por_celula_carregamento if bytes_por_celula_carregamento is not None else BYTES_POR_CELULA_CARREGAMENTO_PADRAO,
+        'memoria_base': statistics.median(memorias_base) if memorias_base else MEMORIA_BASE_PADRAO,
+        # Sem medição, supõe que toda a memória do pico da leitura continua ocupada (estimativa conservadora)
+        'bytes_retidos_por_celula': bytes_retidos_por_celula if bytes_retidos_por_celula is not None else (bytes_por_celula_carregamento or BYTES_POR_CELULA_CARREGAMENTO_PADRAO),
+        'segundos_por_celula': segundos_por_celula or SEGUNDOS_POR_CELULA_RELATORIO_PADRAO,
+        'segundos_por_celula_carregamento': segundos_por_celula_carregamento or SEGUNDOS_POR_CELULA_CARREGAMENTO_PADRAO,
+    }
+
+def _estimar_linhas_juncao(linhas_esquerda: int, linhas_direita: int, how_tipo: str) -> int:
+    """Estimativa (limite superior) de linhas após uma junção, assumindo chave única à direita."""
+    if how_tipo == 'outer':
+        return linhas_esquerda + linhas_direita
+    if how_tipo == 'right':
+        return max(linhas_esquerda, linhas_direita)
+    return linhas_esquerda # 'left' e 'inner'
+
+def planejar_relatorio(nome_relatorio: str, definicao_relatorio: dict, metadados: dict, historico: list[dict], nome_pacote: str = None) -> dict:
+    """
+    Percorre as etapas que gerar_relatorio executaria para a definição (junção, agrupamento,
+    agregação, seleção, ordenação e escrita) usando apenas os metadados das fontes.
+    Nada é lido além dos cabeçalhos, e nada é gravado ou enviado.
+    """
+    fontes_dados_config = definicao_relatorio.get('fontes_dados')
+    if not fontes_dados_config or not isinstance(fontes_dados_config, list) or not fontes_dados_config[0].get('nome'):
+        raise ValueError(f"A definição 'fontes_dados' do relatório '{nome_relatorio}' está ausente ou malformada.")
+
+    fonte_principal_nome = fontes_dados_config[0]['nome']
+    if fonte_principal_nome not in metadados:
+        raise ValueError(f"Fonte de dados principal '{fonte_principal_nome}' do relatório '{nome_relatorio}' não encontrada.")
+
+    calibracao = calibrar_estimativas(historico, nome_relatorio, nome_pacote)
+    processamento = definicao_relatorio.get('processamento_relatorio') or {}
+    colunas_saida = definicao_relatorio.get('colunas_saida') or []
+    etapas = []
+
+    # Colunas usadas: da fonte principal, as referenciadas na definição; das fontes à direita, a chave e as referenciadas.
+    # A fonte principal ainda é copiada inteira antes das junções, por isso colunas_atuais parte de todas as suas colunas.
+    referenciadas = colunas_referenciadas(definicao_relatorio)
+    chaves_juncao = [coluna_juncao(juncao) for juncao in definicao_relatorio.get('juncoes') or []]
+    colunas_usadas = {fonte_principal_nome: [col for col in metadados[fonte_principal_nome]['colunas'] if col in referenciadas or col in chaves_juncao]}
+    colunas_atuais = list(metadados[fonte_principal_nome]['colunas'])
+    linhas = metadados[fonte_principal_nome]['linhas']
+    etapas.append({'etapa': 'leitura', 'descricao': f"Fonte principal '{fonte_principal_nome}'", 'linhas': linhas})
+
+    for juncao in definicao_relatorio.get('juncoes') or []:
+        df_direita_nome = juncao.get('direito')
+        on_coluna = coluna_juncao(juncao)
+        how_tipo = juncao.get('how', 'left')
+        if df_direita_nome not in metadados or on_coluna not in metadados[df_direita_nome]['colunas']:
+            etapas.append({'etapa': 'juncao', 'descricao': f"Junção com '{df_direita_nome}' seria pulada (fonte ou chave ausente)", 'linhas': linhas})
+            continue
+
+        colunas_direita = [on_coluna] + [col for col in referenciadas if col in metadados[df_direita_nome]['colunas'] and col != on_coluna]
+        colunas_usadas[df_direita_nome] = colunas_direita
+        colunas_atuais += [col for col in colunas_direita if col not in colunas_atuais]
+        linhas = _estimar_linhas_juncao(linhas, metadados[df_direita_nome]['linhas'], how_tipo)
+        etapas.append({'etapa': 'juncao', 'descricao': f"Junção {how_tipo} com '{df_direita_nome}' em '{on_coluna}'", 'linhas': linhas})
+
+    if calibracao['fator_juncoes'] is not None:
+        linhas = round(metadados[fonte_principal_nome]['linhas'] * calibracao['fator_juncoes'])
+    linhas_apos_juncoes = linhas
+    celulas_apos_juncoes = linhas_apos_juncoes * len(colunas_atuais)
+
+    agrupar_por = processamento.get('agrupar_por')
+    agregacoes_yaml = processamento.get('agregacoes')
+    if processamento.get('tipo') == 'pivot':
+        # O número de linhas e colunas da matriz depende das cardinalidades, desconhecidas sem ler os dados
+        if calibracao['fator_saida'] is not None:
+            linhas = round(linhas * calibracao['fator_saida'])
+        linhas_pivot = processamento.get('linhas') or []
+        colunas_atuais = [linhas_pivot] if isinstance(linhas_pivot, str) else list(linhas_pivot) # As colunas da matriz só são conhecidas com os dados
+        etapas.append({'etapa': 'pivot', 'descricao': f"Pivot {processamento.get('linhas')} x {processamento.get('colunas')}: "
+                                                      f"{processamento.get('funcao', 'sum')}({processamento.get('valores')})", 'linhas': linhas})
+    elif agrupar_por and agregacoes_yaml:
+        agregacoes = [f"{nome}={def_agg.get('funcao')}({def_agg.get('coluna_origem')})" for nome, def_agg in agregacoes_yaml.items()]
+        # Chaves de tempo ('data:mes') geram a coluna 'data_mes' no resultado
+        chaves_saida = [nome_saida_chave(col) for col in agrupar_por if separar_chave_tempo(col)[0] in colunas_atuais]
+        colunas_atuais = chaves_saida + list(agregacoes_yaml) + list(processamento.get('acumulados') or {})
+        # Sem histórico, o número de grupos é desconhecido; usamos o limite superior
+        if calibracao['fator_saida'] is not None:
+            linhas = round(linhas * calibracao['fator_saida'])
+        etapas.append({'etapa': 'agrupamento', 'descricao': f"Agrupar por {agrupar_por}: {', '.join(agregacoes)}", 'linhas': linhas})
+
+    top_n_config = definicao_relatorio.get('top_n')
+    if top_n_config:
+        limite = top_n_config.get('limite')
+        por_grupo = top_n_config.get('por_grupo') or []
+        if top_n_config.get('coluna_rank'):
+            colunas_atuais.append(top_n_config['coluna_rank'])
+        # Sem grupos, o resultado tem no máximo 'limite' linhas; por grupo, depende do número de grupos
+        if limite is not None and not por_grupo:
+            linhas = min(linhas, int(limite))
+        descricao_grupo = f" dentro de {por_grupo}" if por_grupo else ""
+        etapas.append({'etapa': 'top_n', 'descricao': f"Top {limite if limite is not None else 'todos (rank)'} por '{top_n_config.get('coluna')}'{descricao_grupo} (seleção parcial)", 'linhas': linhas})
+
+    if colunas_saida:
+        colunas_atuais = [col for col in colunas_saida if col in colunas_atuais]
+        etapas.append({'etapa': 'selecao', 'descricao': f"Selecionar {colunas_atuais}", 'linhas': linhas})
+
+    if 'ordenar_por' in definicao_relatorio:
+        sort_cols = definicao_relatorio['ordenar_por'].get('colunas', [])
+        etapas.append({'etapa': 'ordenacao', 'descricao': f"Ordenar por {sort_cols}", 'linhas': linhas})
+
+    etapas.append({'etapa': 'escrita', 'descricao': "Gravar Excel (não executado no modo --explicar)", 'linhas': linhas})
+
+    return {
+        'relatorio': nome_relatorio,
+        'etapas': etapas,
+        'colunas_usadas': colunas_usadas,
+        'linhas_apos_juncoes': linhas_apos_juncoes,
+        'linhas_saida': linhas,
+        'pico_memoria_estimado_bytes': round(celulas_apos_juncoes * calibracao['bytes_por_celula']),
+        'tempo_estimado_segundos': celulas_apos_juncoes * calibracao['segundos_por_celula'],
+        'amostras_calibracao': calibracao['amostras'],
+    }
+
+def _estimar_execucao(definicoes_relatorios: dict, metadados: dict, historico: list[dict], nome_pacote: str = None) -> dict:
+    """
+    Planeja todos os relatórios e estima o pico de memória (RSS, em bytes) do processo que os executa.
+
+    Cada etapa tem o seu próprio pico medido (ver pipeline_relatorios). A leitura atinge o seu
+    pico e deixa os DataFrames carregados; depois, os relatórios rodam um de cada vez e liberam a
+    memória ao terminar. Assim, o pico do processo é a memória antes da leitura mais o maior entre
+    o pico da leitura e (memória retida após a leitura + maior pico de relatório), independente
+    da ordem dos relatórios.
+    """
+    calibracao_geral = calibrar_estimativas(historico, None, nome_pacote)
+    celulas_entrada = sum(meta['linhas'] * len(meta['colunas']) for meta in metadados.values())
+
+    planos = []
+    for nome_relatorio, def_relatorio in definicoes_relatorios.items():
+        try:
+            planos.append(planejar_relatorio(nome_relatorio, def_relatorio, metadados, historico, nome_pacote))
+        except ValueError as e:
+            logger.error(f"Não foi possível planejar o relatório '{nome_relatorio}': {e}")
+
+    pico_carregamento = celulas_entrada * calibracao_geral['bytes_por_celula_carregamento']
+    memoria_retida = celulas_entrada * calibracao_geral['bytes_retidos_por_celula']
+    maior_pico_relatorio = max((plano['pico_memoria_estimado_bytes'] for plano in planos), default=0)
+    return {
+        'planos': planos,
+        'memoria_base': calibracao_geral['memoria_base'],
+        'pico_carregamento': pico_carregamento,
+        'memoria_retida': memoria_retida,
+        'segundos_carregamento': celulas_entrada * calibracao_geral['segundos_por_celula_carregamento'],
+        'pico_processo': round(calibracao_geral['memoria_base'] + max(pico_carregamento, memoria_retida + maior_pico_relatorio)),
+    }
+
+def estimar_recursos_pacote(definicoes_relatorios: dict, caminhos_arquivos: dict, nome_pacote: str = None) -> dict:
+    """
+    Estima o pico de memória (RSS, em bytes) e a duração (em segundos) do processo que
+    executa todos os relatórios de um pacote: {'memoria_bytes': ..., 'segundos': ...}.
+    """
+    metadados = ler_metadados_fontes(caminhos_arquivos)
+    estimativa = _estimar_execucao(definicoes_relatorios, metadados, carregar_historico_execucoes(), nome_pacote)
+    return {
+        'memoria_bytes': estimativa['pico_processo'],
+        'segundos': estimativa['segundos_carregamento'] + sum(plano['tempo_estimado_segundos'] for plano in estimativa['planos']),
+    }
+
+def _formatar_bytes(num_bytes: float) -> str:
+    for unidade in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unidade == 'GB':
+            return f"{num_bytes:.1f} {unidade}"
+        num_bytes /= 1024
+
+def explicar_relatorios(definicoes_relatorios: dict, caminhos_arquivos: dict) -> list[dict]:
+    """
+    Modo --explicar: imprime o plano de execução de cada relatório com as colunas usadas
+    por fonte e as estimativas de linhas, memória e tempo. Retorna a lista de planos.
+    """
+    metadados = ler_metadados_fontes(caminhos_arquivos)
+    historico = carregar_historico_execucoes()
+    estimativa = _estimar_execucao(definicoes_relatorios, metadados, historico)
+
+    print("=== Plano de execução (modo --explicar: nada será gravado ou enviado) ===")
+    print(f"Execuções no histórico usadas para calibração: {len(historico)}")
+    for nome_fonte, meta in metadados.items():
+        print(f"  Fonte '{nome_fonte}': {meta['linhas']} linhas, colunas {meta['colunas']}")
+    print(f"  Memória do processo antes da leitura: {_formatar_bytes(estimativa['memoria_base'])}")
+    print(f"  Carregamento estimado: pico de +{_formatar_bytes(estimativa['pico_carregamento'])} acima da memória antes da leitura "
+          f"(+{_formatar_bytes(estimativa['memoria_retida'])} retidos após a leitura), {estimativa['segundos_carregamento']:.1f} s")
+
+    for plano in estimativa['planos']:
+        print(f"\nRelatório '{plano['relatorio']}' (calibrado com {plano['amostras_calibracao']} execução(ões) anterior(es)):")
+        for numero, etapa in enumerate(plano['etapas'], start=1):
+            print(f"  {numero}. [{etapa['etapa']}] {etapa['descricao']} -> ~{etapa['linhas']} linhas")
+        for nome_fonte, colunas in plano['colunas_usadas'].items():
+            print(f"  Colunas usadas de '{nome_fonte}': {colunas}")
+        print(f"  Pico de memória estimado do relatório (acima da memória já ocupada): +{_formatar_bytes(plano['pico_memoria_estimado_bytes'])} | "
+              f"Tempo estimado: {plano['tempo_estimado_segundos']:.1f} s")
+
+    print(f"\nPico estimado de memória do processo (antes da leitura + maior entre a leitura e "
+          f"dados retidos + relatório mais pesado): {_formatar_bytes(estimativa['pico_processo'])}")
+    logger.info(f"Modo --explicar concluído para {len(estimativa['planos'])} relatório(s). Nenhum arquivo foi gravado ou enviado.")
+    return estimativa['planos']
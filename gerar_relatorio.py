@@ -1,16 +1,424 @@
 # Caminho: Automação de Relatórios Empresariais/gerar_relatorio.py
 
 import pandas as pd
+import numpy as np
 import logging
 import os
-from config import CAMINHO_RELATORIOS
 
 logger = logging.getLogger(__name__)
 
+# Abaixo desta fração de células preenchidas, a matriz do pivot é montada em formato esparso
+LIMIAR_DENSIDADE_PIVOT = 0.1
+
+FUNCOES_PIVOT = ('sum', 'count', 'mean', 'max', 'min')
+
+# Granularidades aceitas em chaves de tempo como 'data:dia' (em 'agrupar_por' ou nos eixos do pivot)
+GRANULARIDADES_TEMPO = {'dia': 'D', 'semana': 'W', 'mes': 'M', 'ano': 'Y'}
+# Formato das datas nos cabeçalhos do pivot, por granularidade (a semana é rotulada pela segunda-feira)
+FORMATOS_ROTULO_TEMPO = {'dia': '%Y-%m-%d', 'semana': '%Y-%m-%d', 'mes': '%Y-%m', 'ano': '%Y'}
+
+FUNCOES_ACUMULADAS = ('cumsum', 'cummax', 'cummin')
+
+# No top-N por grupo, abaixo desta média de linhas por grupo maior que o limite, o laço por
+# grupo da seleção parcial custa mais que uma ordenação completa
+MIN_LINHAS_POR_GRUPO_TOP_N = 30
+
+def _como_lista(valor) -> list:
+    """Aceita no YAML tanto um nome de coluna quanto uma lista de nomes."""
+    if valor is None:
+        return []
+    return [valor] if isinstance(valor, str) else list(valor)
+
+def coluna_juncao(juncao: dict) -> str:
+    """Coluna 'on' de uma junção do YAML (o YAML 1.1 interpreta a chave 'on' como o booleano True)."""
+    return juncao.get('on', juncao.get(True))
+
+def separar_chave_tempo(chave: str) -> tuple[str, str | None]:
+    """Separa uma chave de agrupamento em (coluna, granularidade): 'data:mes' -> ('data', 'mes'), 'cliente' -> ('cliente', None)."""
+    coluna, _, granularidade = chave.partition(':')
+    return coluna, granularidade or None
+
+def nome_saida_chave(chave: str) -> str:
+    """Nome da coluna gerada por uma chave de agrupamento: 'data:mes' -> 'data_mes', 'cliente' -> 'cliente'."""
+    coluna, granularidade = separar_chave_tempo(chave)
+    return f"{coluna}_{granularidade}" if granularidade else coluna
+
+def colunas_referenciadas(definicao_relatorio: dict) -> list[str]:
+    """Colunas usadas na saída ou no processamento (agrupamento, agregações e pivot) da definição."""
+    processamento = definicao_relatorio.get('processamento_relatorio') or {}
+    colunas = list(definicao_relatorio.get('colunas_saida') or [])
+    colunas += _como_lista(processamento.get('agrupar_por'))
+    colunas += [def_agg.get('coluna_origem') for def_agg in (processamento.get('agregacoes') or {}).values()]
+    colunas += _como_lista(processamento.get('linhas')) + _como_lista(processamento.get('colunas')) + _como_lista(processamento.get('valores'))
+    # Chaves de tempo ('data:mes') referenciam a coluna de origem ('data')
+    return list(dict.fromkeys(separar_chave_tempo(col)[0] for col in colunas if col))
+
+def _truncar_datas(valores: np.ndarray, granularidade: str) -> np.ndarray:
+    """Trunca um array datetime64 para o início do dia, semana (segunda-feira), mês ou ano."""
+    if granularidade == 'semana':
+        dias = valores.astype('datetime64[D]')
+        # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 é o dia da semana com segunda = 0
+        dia_da_semana = (dias.view('int64') + 3) % 7
+        truncado = dias - dia_da_semana.astype('timedelta64[D]')
+    else:
+        truncado = valores.astype(f"datetime64[{GRANULARIDADES_TEMPO[granularidade]}]")
+    return truncado.astype(valores.dtype) # Volta à unidade original (NaT é preservado)
+
+def _serie_agrupamento(df: pd.DataFrame, chave: str) -> pd.Series:
+    """
+    Retorna a série usada como chave de agrupamento. Para chaves de tempo como 'data:semana',
+    a data é truncada em uma operação vetorizada sobre o array datetime64 e devolvida como
+    uma série à parte ('data_semana'), sem criar colunas auxiliares no DataFrame.
+    """
+    coluna, granularidade = separar_chave_tempo(chave)
+    if granularidade is None:
+        return df[coluna]
+
+    if granularidade not in GRANULARIDADES_TEMPO:
+        raise ValueError(f"Granularidade de tempo '{granularidade}' inválida em '{chave}'. Use uma de: {list(GRANULARIDADES_TEMPO)}.")
+    if not pd.api.types.is_datetime64_dtype(df[coluna].dtype):
+        raise ValueError(f"A coluna '{coluna}' usada em '{chave}' não é do tipo data.")
+    valores = df[coluna].to_numpy()
+    return pd.Series(_truncar_datas(valores, granularidade), index=df.index, name=nome_saida_chave(chave))
+
+def _numerar_periodos(valores: np.ndarray, granularidade: str) -> np.ndarray:
+    """Número sequencial de cada período (datas já truncadas): períodos consecutivos diferem em 1."""
+    if granularidade in ('dia', 'semana'):
+        dias = valores.astype('datetime64[D]').view('int64')
+        # Semanas começam na segunda-feira; 1970-01-01 foi uma quinta-feira
+        return (dias + 3) // 7 if granularidade == 'semana' else dias
+    return valores.astype(f"datetime64[{GRANULARIDADES_TEMPO[granularidade]}]").view('int64')
+
+def _calcular_acumulados(df: pd.DataFrame, acumulados_yaml: dict, coluna_tempo: str, granularidade: str, outras_chaves: list[str]) -> pd.DataFrame:
+    """
+    Adiciona métricas acumuladas (cumsum, cummax, cummin) ou móveis (funcao + janela em
+    número de períodos) ao longo da chave de tempo, separadamente para cada combinação
+    das demais chaves de agrupamento. Opera sobre o resultado já agregado.
+
+    A janela móvel conta períodos, não linhas: um período sem dados dentro da janela não
+    faz a janela alcançar períodos mais antigos. Cada período vira um dia em um eixo
+    auxiliar, e a janela por tempo ('<janela>D') cobre exatamente 'janela' períodos.
+    """
+    df = df.sort_values(outras_chaves + [coluna_tempo], ignore_index=True)
+    eixo_periodos = pd.to_datetime(_numerar_periodos(df[coluna_tempo].to_numpy(), granularidade), unit='D')
+    for nome_nova_coluna, def_acumulado in acumulados_yaml.items():
+        coluna_origem = def_acumulado.get('coluna_origem')
+        funcao = def_acumulado.get('funcao')
+        janela = def_acumulado.get('janela')
+        if coluna_origem not in df.columns or not funcao:
+            logger.warning(f"Acumulado malformado ou coluna '{coluna_origem}' inexistente para '{nome_nova_coluna}'. Pulando.")
+            continue
+
+        if janela:
+            valores = pd.Series(df[coluna_origem].to_numpy(), index=eixo_periodos)
+            if outras_chaves:
+                valores = valores.groupby([df[chave].to_numpy() for chave in outras_chaves], sort=False, dropna=False)
+            movel = valores.rolling(f"{int(janela)}D", min_periods=1).agg(funcao)
+            # O df está ordenado pelas demais chaves e os grupos saem na ordem em que aparecem,
+            # então o resultado está na mesma ordem das linhas do df
+            df[nome_nova_coluna] = movel.to_numpy()
+        elif funcao in FUNCOES_ACUMULADAS:
+            serie = df.groupby(outras_chaves, sort=False, dropna=False)[coluna_origem] if outras_chaves else df[coluna_origem]
+            df[nome_nova_coluna] = getattr(serie, funcao)()
+        else:
+            logger.warning(f"Função '{funcao}' sem 'janela' em '{nome_nova_coluna}'. Use {FUNCOES_ACUMULADAS} ou informe 'janela'. Pulando.")
+    return df
+
+def _codificar_eixo(df: pd.DataFrame, colunas: list[str]):
+    """
+    Converte as colunas de um eixo do pivot em um único código inteiro por linha
+    (0..k-1, na ordem das colunas; -1 se algum valor for nulo) e retorna (códigos, rótulos).
+    Com várias colunas, os códigos de cada uma são combinados aritmeticamente, sem tuplas.
+    """
+    codigos = np.zeros(len(df), dtype=np.int64)
+    nulos = np.zeros(len(df), dtype=bool)
+    unicos_por_coluna = []
+    nomes_saida = []
+    for coluna in colunas:
+        serie = _serie_agrupamento(df, coluna)
+        codigos_coluna, unicos = pd.factorize(serie, sort=True) # Códigos ordenados, -1 para nulos
+        nulos |= codigos_coluna < 0
+        codigos = codigos * len(unicos) + codigos_coluna
+        unicos_por_coluna.append(unicos)
+        nomes_saida.append(serie.name)
+    if len(colunas) == 1:
+        return np.where(nulos, -1, codigos), pd.DataFrame({nomes_saida[0]: unicos_por_coluna[0]})
+
+    codigos, combinacoes = pd.factorize(np.where(nulos, -1, codigos), sort=True, use_na_sentinel=False)
+    if len(combinacoes) and combinacoes[0] == -1:
+        # factorize ordenado coloca o -1 (nulos) na posição 0: desloca os demais códigos
+        codigos = codigos - 1
+        combinacoes = combinacoes[1:]
+    # Decodifica cada combinação de volta para os valores de cada coluna
+    rotulos = {}
+    for nome, unicos in zip(reversed(nomes_saida), reversed(unicos_por_coluna)):
+        combinacoes, codigos_coluna = np.divmod(combinacoes, len(unicos))
+        rotulos[nome] = unicos.take(codigos_coluna)
+    return codigos, pd.DataFrame({nome: rotulos[nome] for nome in nomes_saida})
+
+def _formatar_rotulos(rotulos: pd.Series, chave: str) -> list[str]:
+    """
+    Textos dos valores de um eixo para os cabeçalhos do pivot. Datas saem no formato da
+    granularidade da chave ('2005-01' em 'data:mes'), em vez de '2005-01-01 00:00:00'.
+    """
+    if pd.api.types.is_datetime64_dtype(rotulos.dtype):
+        granularidade = separar_chave_tempo(chave)[1]
+        if granularidade is not None or (rotulos.dropna() == rotulos.dropna().dt.normalize()).all():
+            return rotulos.dt.strftime(FORMATOS_ROTULO_TEMPO[granularidade or 'dia']).tolist()
+    return [str(valor) for valor in rotulos]
+
+def _agregar_por_codigo(codigos: np.ndarray, valores: np.ndarray, tamanho: int, funcao: str) -> np.ndarray:
+    """Agrega 'valores' por código inteiro em uma única passada (bincount / ufunc.at)."""
+    if funcao == 'count':
+        return np.bincount(codigos[~np.isnan(valores)], minlength=tamanho).astype(float)
+    # Como no groupby: a soma de um grupo só com valores nulos é 0; as demais funções resultam em nulo
+    presentes = np.bincount(codigos, minlength=tamanho)
+    validos = ~np.isnan(valores)
+    codigos, valores = codigos[validos], valores[validos]
+    contagem = presentes if funcao == 'sum' else np.bincount(codigos, minlength=tamanho)
+    if funcao in ('sum', 'mean'):
+        resultado = np.bincount(codigos, weights=valores, minlength=tamanho)
+        if funcao == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                resultado = resultado / contagem
+    else:
+        resultado = np.full(tamanho, -np.inf if funcao == 'max' else np.inf)
+        (np.maximum if funcao == 'max' else np.minimum).at(resultado, codigos, valores)
+    resultado = resultado.astype(float)
+    resultado[contagem == 0] = np.nan
+    return resultado
+
+def _gerar_pivot(df: pd.DataFrame, processamento: dict) -> pd.DataFrame:
+    """
+    Gera uma matriz (linhas x colunas) agregando 'valores' com 'funcao' em uma única
+    passada vetorizada sobre os códigos inteiros dos eixos. Apenas as células com dados
+    são calculadas; se a matriz for esparsa, as colunas de saída são SparseArrays e a
+    matriz densa nunca é materializada.
+    """
+    linhas = _como_lista(processamento.get('linhas'))
+    colunas = _como_lista(processamento.get('colunas'))
+    valores = processamento.get('valores')
+    funcao = processamento.get('funcao', 'sum')
+    totais = processamento.get('totais', False)
+
+    if not linhas or not colunas:
+        raise ValueError("O pivot exige 'linhas' e 'colunas' em 'processamento_relatorio'.")
+    if funcao not in FUNCOES_PIVOT:
+        raise ValueError(f"Função de pivot '{funcao}' não suportada. Use uma de: {FUNCOES_PIVOT}.")
+    if not valores and funcao != 'count':
+        raise ValueError("O pivot exige 'valores' (exceto com funcao 'count').")
+    colunas_ausentes = [col for col in linhas + colunas + ([valores] if valores else []) if separar_chave_tempo(col)[0] not in df.columns]
+    if colunas_ausentes:
+        raise KeyError(f"Colunas do pivot ausentes no DataFrame após junções: {colunas_ausentes}.")
+
+    codigos_linha, rotulos_linha = _codificar_eixo(df, linhas)
+    codigos_coluna, rotulos_coluna = _codificar_eixo(df, colunas)
+    n_linhas, n_colunas = len(rotulos_linha), len(rotulos_coluna)
+    if not valores:
+        dados = np.zeros(len(df))
+    elif funcao == 'count':
+        # Para contar basta saber se há valor: aceita colunas de texto (0 = presente, NaN = nulo)
+        dados = np.where(df[valores].notna().to_numpy(), 0.0, np.nan)
+    else:
+        dados = df[valores].to_numpy(dtype=float, na_value=np.nan)
+
+    # Linhas com eixo nulo ficam fora da matriz (mesmo comportamento do groupby)
+    eixos_validos = (codigos_linha >= 0) & (codigos_coluna >= 0)
+    if not eixos_validos.all():
+        codigos_linha, codigos_coluna, dados = codigos_linha[eixos_validos], codigos_coluna[eixos_validos], dados[eixos_validos]
+
+    # Cada célula é identificada por um único inteiro; factorize mantém só as células com dados (formato COO)
+    codigos_celula = codigos_linha.astype(np.int64) * n_colunas + codigos_coluna
+    ids_celula, celulas = pd.factorize(codigos_celula)
+    valores_celula = _agregar_por_codigo(ids_celula, dados, len(celulas), funcao)
+    linha_celula, coluna_celula = np.divmod(celulas, n_colunas)
+
+    textos_colunas = [_formatar_rotulos(rotulos_coluna[nome], chave) for nome, chave in zip(rotulos_coluna.columns, colunas)]
+    nomes_colunas = [' / '.join(partes) for partes in zip(*textos_colunas)]
+    # Valores do eixo de colunas iguais a uma coluna de rótulo ou a 'Total' recebem o nome do eixo,
+    # para não sobrescrever nem duplicar colunas (ex.: produto 'Total' vira 'Total (produto)')
+    if totais and 'Total' in rotulos_linha.columns:
+        raise ValueError("Com 'totais', o eixo de linhas do pivot não pode ter uma coluna chamada 'Total'.")
+    reservados = set(rotulos_linha.columns) | ({'Total'} if totais else set())
+    sufixo_eixo = ' / '.join(rotulos_coluna.columns)
+    nomes_colunas = [f"{nome} ({sufixo_eixo})" if nome in reservados else nome for nome in nomes_colunas]
+    densidade = len(celulas) / max(n_linhas * n_colunas, 1)
+    if densidade >= LIMIAR_DENSIDADE_PIVOT:
+        matriz = np.full((n_linhas, n_colunas), np.nan)
+        matriz[linha_celula, coluna_celula] = valores_celula
+        df_valores = pd.DataFrame(matriz, columns=nomes_colunas)
+    else:
+        # Uma SparseArray por coluna da matriz: no máximo uma coluna densa existe por vez
+        ordem = np.lexsort((linha_celula, coluna_celula))
+        linha_celula, coluna_celula, valores_celula = linha_celula[ordem], coluna_celula[ordem], valores_celula[ordem]
+        limites = np.searchsorted(coluna_celula, np.arange(n_colunas + 1))
+        colunas_esparsas = {}
+        for i, nome in enumerate(nomes_colunas):
+            coluna_densa = np.full(n_linhas, np.nan)
+            coluna_densa[linha_celula[limites[i]:limites[i + 1]]] = valores_celula[limites[i]:limites[i + 1]]
+            colunas_esparsas[nome] = pd.arrays.SparseArray(coluna_densa, fill_value=np.nan)
+        df_valores = pd.DataFrame(colunas_esparsas)
+    logger.debug(f"Pivot {linhas} x {colunas}: {n_linhas}x{n_colunas} células, densidade {densidade:.1%}.")
+
+    df_pivot = pd.concat([rotulos_linha, df_valores], axis=1)
+    if totais:
+        df_pivot['Total'] = _agregar_por_codigo(codigos_linha, dados, n_linhas, funcao)
+        linha_total = {col: None for col in rotulos_linha.columns}
+        linha_total[rotulos_linha.columns[0]] = 'Total'
+        linha_total.update(zip(nomes_colunas, _agregar_por_codigo(codigos_coluna, dados, n_colunas, funcao)))
+        linha_total['Total'] = _agregar_por_codigo(np.zeros(len(dados), dtype=np.int64), dados, 1, funcao)[0]
+        df_pivot = pd.concat([df_pivot, pd.DataFrame([linha_total])], ignore_index=True)
+    return df_pivot
+
+def _ordenar_codigos(codigos: np.ndarray) -> np.ndarray:
+    """
+    Ordenação estável (argsort) de códigos inteiros não negativos em O(n): radix sort LSD
+    em passadas de 16 bits, para as quais o numpy usa radix sort em vez de timsort.
+    """
+    ordem = np.argsort((codigos & 0xFFFF).astype(np.uint16), kind='stable')
+    deslocamento = 16
+    while len(codigos) and codigos.max() >> deslocamento:
+        ordem = ordem[np.argsort(((codigos[ordem] >> deslocamento) & 0xFFFF).astype(np.uint16), kind='stable')]
+        deslocamento += 16
+    return ordem
+
+def _top_n_por_grupo(valores: np.ndarray, codigos_grupo: np.ndarray, limite: int, ascendente: bool):
+    """
+    Seleção parcial por grupo: retorna (posições das linhas selecionadas, posição de cada uma
+    no seu grupo, começando em 1), na ordem grupo -> posição. Valores nulos ficam de fora e
+    empates são desempatados pela ordem original, como em rank(method='first').
+
+    As linhas são agrupadas por uma ordenação estável O(n) dos códigos inteiros de grupo e,
+    em cada grupo maior que o limite, np.partition encontra o valor de corte (o N-ésimo)
+    sem ordenar o grupo. Só as linhas selecionadas são ordenadas no final. Compensa quando
+    há poucos grupos maiores que o limite (ver MIN_LINHAS_POR_GRUPO_TOP_N).
+    """
+    if limite == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    chave = valores if ascendente else -valores # Menor chave = melhor posição
+    validos = np.flatnonzero(~np.isnan(valores))
+    ordem = validos[_ordenar_codigos(codigos_grupo[validos])] # Dentro do grupo, mantém a ordem original
+    codigos_ordem, chave_ordem = codigos_grupo[ordem], chave[ordem]
+    tamanhos = np.bincount(codigos_ordem)
+    limites = np.concatenate(([0], np.cumsum(tamanhos)))
+
+    # Valor de corte de cada grupo; grupos com até 'limite' linhas entram inteiros
+    corte = np.full(len(tamanhos), np.inf)
+    for grupo in np.flatnonzero(tamanhos > limite):
+        corte[grupo] = np.partition(chave_ordem[limites[grupo]:limites[grupo + 1]], limite - 1)[limite - 1]
+
+    # Todos os melhores que o corte e, entre os iguais ao corte, os primeiros na ordem original
+    corte_linha = corte[codigos_ordem]
+    manter = chave_ordem < corte_linha
+    faltam = limite - np.bincount(codigos_ordem[manter], minlength=len(tamanhos))
+    empates = np.flatnonzero(chave_ordem == corte_linha)
+    codigos_empates = codigos_ordem[empates]
+    posicao_empate = np.arange(len(empates)) - np.searchsorted(codigos_empates, codigos_empates, side='left')
+    manter[empates[posicao_empate < faltam[codigos_empates]]] = True
+
+    # Ordena apenas as linhas selecionadas por valor e depois por grupo; como já estão na ordem
+    # original dentro de cada grupo, as ordenações estáveis mantêm essa ordem nos empates
+    linhas = ordem[manter]
+    linhas = linhas[np.argsort(chave[linhas], kind='stable')]
+    linhas = linhas[_ordenar_codigos(codigos_grupo[linhas])]
+    codigos_ordenados = codigos_grupo[linhas]
+    posicoes = np.arange(len(linhas)) - np.searchsorted(codigos_ordenados, codigos_ordenados, side='left') + 1
+    return linhas, posicoes
+
+def _selecionar_top_n(df: pd.DataFrame, top_n_config: dict) -> pd.DataFrame:
+    """
+    Seleciona as N primeiras linhas por uma coluna (global ou dentro de cada grupo) e,
+    opcionalmente, adiciona a posição de cada linha (rank).
+
+    Com 'limite' e coluna numérica, usa seleção parcial (nlargest/nsmallest, ou
+    _top_n_por_grupo por grupo) em vez de ordenar o DataFrame inteiro; apenas as linhas
+    selecionadas são ordenadas no final. Sem 'limite' (só o rank), com coluna não numérica
+    ou com muitos grupos pequenos, o custo é o de uma ordenação completa, O(n log n). Aplicar a função sobre a concatenação de resultados
+    parciais dá o mesmo top-N que aplicá-la aos dados completos, desde que os valores da
+    coluna já estejam agregados.
+    """
+    coluna = top_n_config.get('coluna')
+    limite = top_n_config.get('limite')
+    ascendente = top_n_config.get('ascendente', False) # Padrão: maiores valores primeiro
+    por_grupo = top_n_config.get('por_grupo') or []
+    coluna_rank = top_n_config.get('coluna_rank')
+
+    if not coluna or coluna not in df.columns:
+        logger.warning(f"Coluna '{coluna}' para top-N não encontrada no relatório. Top-N ignorado.")
+        return df
+    if limite is None and not coluna_rank:
+        logger.warning("Top-N definido sem 'limite' nem 'coluna_rank'. Top-N ignorado.")
+        return df
+    if limite is not None:
+        limite = int(limite)
+        if limite < 0:
+            raise ValueError(f"O 'limite' do top-N deve ser maior ou igual a zero (recebido: {limite}).")
+
+    grupos_ausentes = [col for col in por_grupo if col not in df.columns]
+    if grupos_ausentes:
+        logger.warning(f"Colunas de grupo do top-N ausentes no relatório: {grupos_ausentes}. Top-N ignorado.")
+        return df
+
+    numerica = pd.api.types.is_numeric_dtype(df[coluna].dtype) and not pd.api.types.is_bool_dtype(df[coluna].dtype)
+    if not por_grupo and limite is not None and numerica:
+        # Seleção parcial: O(n log N) em vez do O(n log n) de uma ordenação completa
+        df_top = df.nsmallest(limite, coluna) if ascendente else df.nlargest(limite, coluna)
+        if coluna_rank:
+            df_top = df_top.assign(**{coluna_rank: range(1, len(df_top) + 1)})
+        logger.debug(f"Top-N por '{coluna}' selecionado: {len(df_top)} linhas.")
+        return df_top
+
+    if por_grupo and limite is not None and numerica:
+        # Códigos na ordem dos grupos (nulos por último): a seleção já sai na ordem grupo -> posição
+        codigos_grupo = df.groupby(por_grupo, sort=True, dropna=False).ngroup().to_numpy()
+        valores = df[coluna].to_numpy(dtype=float, na_value=np.nan)
+        validos = ~np.isnan(valores)
+        grupos_grandes = np.count_nonzero(np.bincount(codigos_grupo[validos]) > limite)
+        if grupos_grandes * MIN_LINHAS_POR_GRUPO_TOP_N <= np.count_nonzero(validos):
+            linhas, posicoes = _top_n_por_grupo(valores, codigos_grupo, limite, ascendente)
+            df_top = df.iloc[linhas].assign(_posicao_top_n=posicoes)
+        else:
+            # Muitos grupos maiores que o limite: uma ordenação estável completa custa menos que o laço
+            # por grupo e mantém a ordem original nos empates, como rank(method='first')
+            df_top = df[validos].sort_values(por_grupo + [coluna], ascending=[True] * len(por_grupo) + [ascendente],
+                                             kind='stable', na_position='last')
+            df_top = df_top.groupby(por_grupo, sort=False, dropna=False).head(limite)
+            df_top = df_top.assign(_posicao_top_n=df_top.groupby(por_grupo, sort=False, dropna=False).cumcount() + 1)
+    else:
+        # Rank (ordenação completa, O(n log n)): sem limite ou coluna não numérica (ex.: texto)
+        try:
+            if por_grupo:
+                posicoes = df.groupby(por_grupo, sort=False, dropna=False)[coluna].rank(method='first', ascending=ascendente)
+            else:
+                posicoes = df[coluna].rank(method='first', ascending=ascendente)
+        except TypeError as e:
+            logger.warning(f"Coluna '{coluna}' do top-N tem valores que não podem ser ordenados ({e}). Top-N ignorado.")
+            return df
+        if not por_grupo and limite is None:
+            # Só o rank: todas as linhas são mantidas (as de valor nulo ficam sem posição, no final)
+            df_top = df.assign(**{coluna_rank: posicoes.astype('Int64')}).sort_values(coluna_rank)
+            logger.debug(f"Top-N por '{coluna}' selecionado: {len(df_top)} linhas.")
+            return df_top
+        mascara = posicoes.notna()
+        if limite is not None:
+            mascara &= posicoes <= limite
+        df_top = df[mascara].assign(_posicao_top_n=posicoes[mascara].astype('int64'))
+        df_top = df_top.sort_values(por_grupo + ['_posicao_top_n'])
+    if coluna_rank:
+        df_top = df_top.rename(columns={'_posicao_top_n': coluna_rank})
+    else:
+        df_top = df_top.drop(columns='_posicao_top_n')
+    logger.debug(f"Top-N por '{coluna}'{f' dentro de {por_grupo}' if por_grupo else ''} selecionado: {len(df_top)} linhas.")
+    return df_top
+
 # Adaptação: gerar_relatorio AGORA RECEBE O DICIONÁRIO DE DATAFRAMES E A DEFINIÇÃO DO RELATÓRIO
-def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: dict, caminho_saida_relatorio: str) -> str:
+def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: dict, caminho_saida_relatorio: str, metricas: dict = None) -> str:
     """
     Gera um relatório dinamicamente com base nas definições fornecidas no YAML.
+
+    Se 'metricas' for informado, o dicionário é preenchido com números da execução
+    (linhas da fonte principal, linhas e células após as junções e linhas de saída),
+    usados para calibrar as estimativas do modo --explicar.
     """
     nome_relatorio_yaml = definicao_relatorio.get('descricao', 'Relatório não especificado')
     logger.info(f"Iniciando a geração do relatório: {nome_relatorio_yaml}")
@@ -37,7 +445,7 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
         if 'juncoes' in definicao_relatorio:
             for juncao in definicao_relatorio['juncoes']:
                 df_direita_nome = juncao.get('direito')
-                on_coluna = juncao.get('on')
+                on_coluna = coluna_juncao(juncao)
                 how_tipo = juncao.get('how', 'left') # Default para left merge
 
                 if not df_direita_nome or df_direita_nome not in dataframes:
@@ -49,7 +457,7 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
                 # Selecionar colunas específicas para junção do dataframe direito, se especificado
                 colunas_direita_para_incluir = [on_coluna] # Sempre incluir a coluna de junção
                 # Adiciona outras colunas do df_direita que serão usadas na saída ou agregação, se não forem a chave de junção
-                for col_saida in definicao_relatorio.get('colunas_saida', []):
+                for col_saida in colunas_referenciadas(definicao_relatorio):
                     if col_saida in df_direita.columns and col_saida != on_coluna:
                         colunas_direita_para_incluir.append(col_saida)
                 
@@ -72,9 +480,18 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
                 except Exception as e:
                     logger.warning(f"Erro inesperado durante a junção: {e}. Junção entre '{fonte_principal_nome}' e '{df_direita_nome}' pode estar incompleta.", exc_info=True)
 
+        if metricas is not None:
+            metricas['linhas_fonte_principal'] = len(dataframes[fonte_principal_nome])
+            metricas['linhas_apos_juncoes'] = len(df_relatorio)
+            metricas['celulas_apos_juncoes'] = int(df_relatorio.size)
+
         # 3. Processamento de Relatório (Agrupar e Agregações)
         processamento = definicao_relatorio.get('processamento_relatorio')
-        if processamento:
+        if processamento and processamento.get('tipo') == 'pivot':
+            # Matriz linhas x colunas (ex.: segmento x produto) calculada em uma única passada
+            df_relatorio = _gerar_pivot(df_relatorio, processamento)
+            logger.debug(f"Pivot gerado com {len(df_relatorio)} linhas e {len(df_relatorio.columns)} colunas.")
+        elif processamento:
             agrupar_por = processamento.get('agrupar_por')
             agregacoes_yaml = processamento.get('agregacoes')
 
@@ -91,8 +508,9 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
 
                 if pandas_aggs:
                     # Garantir que as colunas de agrupamento existam e são válidas
-                    valid_group_cols = [col for col in agrupar_por if col in df_relatorio.columns]
-                    missing_group_cols = [col for col in agrupar_por if col not in df_relatorio.columns]
+                    # Chaves de tempo ('data:mes') são resolvidas em séries truncadas, sem colunas auxiliares
+                    valid_group_cols = [col for col in agrupar_por if separar_chave_tempo(col)[0] in df_relatorio.columns]
+                    missing_group_cols = [col for col in agrupar_por if separar_chave_tempo(col)[0] not in df_relatorio.columns]
 
                     if missing_group_cols:
                         logger.warning(f"Colunas de agrupamento ausentes no DataFrame após junções: {missing_group_cols}. Agrupamento pode ser incompleto ou falhar.")
@@ -102,14 +520,31 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
                         # Se não há colunas para agrupar, somar tudo se houver agregações
                         df_relatorio = df_relatorio.agg(**pandas_aggs).to_frame().T # Soma total, Transpõe para manter formato de DF
                     else:
-                        df_relatorio = df_relatorio.groupby(valid_group_cols, as_index=False).agg(**pandas_aggs)
+                        chaves = [_serie_agrupamento(df_relatorio, col) if separar_chave_tempo(col)[1] else col for col in valid_group_cols]
+                        df_relatorio = df_relatorio.groupby(chaves, as_index=False).agg(**pandas_aggs)
                         logger.debug(f"Agrupamento e agregações realizadas por: {valid_group_cols}.")
+
+                        # Opcional: acumulados/médias móveis ao longo da primeira chave de tempo
+                        acumulados_yaml = processamento.get('acumulados')
+                        if acumulados_yaml:
+                            nomes_chaves = [nome_saida_chave(col) for col in valid_group_cols]
+                            chaves_tempo = [(nome_saida_chave(col), separar_chave_tempo(col)[1]) for col in valid_group_cols if separar_chave_tempo(col)[1]]
+                            if chaves_tempo:
+                                coluna_tempo, granularidade = chaves_tempo[0]
+                                outras_chaves = [nome for nome in nomes_chaves if nome != coluna_tempo]
+                                df_relatorio = _calcular_acumulados(df_relatorio, acumulados_yaml, coluna_tempo, granularidade, outras_chaves)
+                            else:
+                                logger.warning("'acumulados' exige uma chave de tempo em 'agrupar_por' (ex.: 'data:dia'). Acumulados ignorados.")
                 else:
                     logger.warning("Nenhuma agregação válida definida para o relatório.")
             elif agrupar_por:
                 logger.warning("Agrupamento definido, mas nenhuma agregação. Relatório pode não ter as métricas esperadas.")
 
 
+        # Opcional: Top-N / ranking após a agregação (global ou por grupo)
+        if 'top_n' in definicao_relatorio:
+            df_relatorio = _selecionar_top_n(df_relatorio, definicao_relatorio['top_n'] or {})
+
         # 4. Cálculos Adicionais (complexo, aqui apenas um placeholder para futura expansão)
         # if 'calculos_adicionais' in definicao_relatorio:
         #     for calc in definicao_relatorio['calculos_adicionais']:
@@ -131,7 +566,7 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
             
             df_relatorio = df_relatorio[final_cols]
             logger.debug("Colunas de saída selecionadas e ordenadas.")
-        else:
+        elif (processamento or {}).get('tipo') != 'pivot': # No pivot, as colunas dependem dos dados
             logger.warning("Nenhuma coluna de saída especificada. Todas as colunas disponíveis serão incluídas.")
 
         # Opcional: Ordenar o relatório final
@@ -150,10 +585,13 @@ def gerar_relatorio(dataframes: dict[str, pd.DataFrame], definicao_relatorio: di
 
 
         # 6. Salvar o Relatório
-        os.makedirs(CAMINHO_RELATORIOS, exist_ok=True)
+        os.makedirs(os.path.dirname(caminho_saida_relatorio) or '.', exist_ok=True)
         df_relatorio.to_excel(caminho_saida_relatorio, index=False)
         logger.info(f"Relatório salvo com sucesso em: {caminho_saida_relatorio}")
 
+        if metricas is not None:
+            metricas['linhas_saida'] = len(df_relatorio)
+
         return caminho_saida_relatorio
 
     except ValueError as e:
@@ -1,18 +1,36 @@
 # Caminho: Automação de Relatórios Empresariais/main.py
 
-import os
 import logging
+import argparse
 import datetime
 import yaml # Embora não usado diretamente aqui, é bom manter para contexto se houver uso futuro
 
 import config
 from utils import setup_logging, ensure_directories_exist, carregar_definicoes_relatorios
-from processar_dados import carregar_dados
-from gerar_relatorio import gerar_relatorio
-# Importar AMBAS as funções de envio de e-mail
-from enviar_email import enviar_email_relatorio, enviar_email_com_multiplos_anexos
+from pipeline_relatorios import montar_caminhos_entrada, executar_relatorios, enviar_relatorios_consolidados
+from explicar_relatorio import explicar_relatorios
+from agendador import carregar_pacotes, executar_agendamento
+
+def _ler_argumentos():
+    parser = argparse.ArgumentParser(description="Automação de relatórios empresariais.")
+    parser.add_argument(
+        '--explicar',
+        action='store_true',
+        help="Mostra o plano de cada relatório com estimativas de linhas, memória e tempo, sem gerar nem enviar nada."
+    )
+    parser.add_argument(
+        '--pacotes',
+        nargs='?',
+        const=config.CAMINHO_PACOTES_RELATORIOS,
+        default=None,
+        help="Executa vários pacotes de relatórios (definições + dados + saída + destinatários) com o agendador. "
+             "Opcionalmente informe o caminho do YAML de pacotes."
+    )
+    return parser.parse_args()
 
 def main():
+    argumentos = _ler_argumentos()
+
     # 1. Configurar logging
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -23,9 +41,6 @@ def main():
     ensure_directories_exist()
 
     try:
-        # 3. Carregar definições de relatórios
-        definicoes_relatorios = carregar_definicoes_relatorios()
-
         # --- Solicitar ano e mês para processamento ---
         ano_processamento_str = input("Digite o ano para processar os relatórios (ex: 2025): ")
         mes_processamento_str = input("Digite o mês para processar os relatórios (ex: 06): ")
@@ -45,94 +60,42 @@ def main():
 
         logger.info(f"Processando relatórios para o mês de {mes_processamento:02d}/{ano_processamento:04d}.")
 
-        # 4. Definir caminhos dos arquivos de entrada dinamicamente
-        caminhos_arquivos_entrada = {
-            'transacoes': os.path.join(config.CAMINHO_DADOS, f'transacoes_{ano_processamento:04d}_{mes_processamento:02d}.xlsx'),
-            'cadastros': os.path.join(config.CAMINHO_DADOS, f'cadastros_{ano_processamento:04d}_{mes_processamento:02d}.xlsx')
-        }
-
-        # Carregar todos os DataFrames de entrada uma única vez e padronizá-los
-        dataframes_carregados = carregar_dados(caminhos_arquivos_entrada)
-
-        # Lista para armazenar os caminhos dos relatórios que serão enviados em um único e-mail
-        caminhos_relatorios_para_email_unico = []
-
-        # Iterar sobre as definições de relatórios e executá-los
-        for nome_relatorio, def_relatorio in definicoes_relatorios.items():
-            logger.info(f"Executando relatório: {nome_relatorio}.")
-            
-            # Formatar o nome do arquivo de saída de forma consistente
-            # Substitui espaços por underscores e converte para minúsculas
-            nome_arquivo_base = f"{nome_relatorio.replace(' ', '_').lower()}_{ano_processamento:04d}_{mes_processamento:02d}.xlsx"
-            caminho_saida_relatorio = os.path.join(config.CAMINHO_RELATORIOS, nome_arquivo_base)
-            
-            # CHAMA gerar_relatorio COM OS DATAFRAMES CARREGADOS E A DEFINIÇÃO COMPLETA DO RELATÓRIO
-            caminho_relatorio_gerado = gerar_relatorio(
-                dataframes=dataframes_carregados,
-                definicao_relatorio=def_relatorio,
-                caminho_saida_relatorio=caminho_saida_relatorio
-            )
-
-            # Adiciona o caminho do relatório gerado à lista para envio consolidado
-            if caminho_relatorio_gerado and os.path.exists(caminho_relatorio_gerado):
-                caminhos_relatorios_para_email_unico.append(caminho_relatorio_gerado)
-                logger.info(f"Relatório '{nome_relatorio}' adicionado à lista para envio consolidado.")
+        # Modo --pacotes: cada pacote tem suas próprias definições, dados, saída e destinatários
+        if argumentos.pacotes:
+            pacotes = carregar_pacotes(argumentos.pacotes)
+            resultados = executar_agendamento(pacotes, data_referencia)
+            falhas = [nome for nome, resultado in resultados.items() if resultado['status'] != 'sucesso']
+            if falhas:
+                logger.error(f"Pacotes com falha: {falhas}. Os demais pacotes foram concluídos normalmente.")
             else:
-                logger.error(f"Relatório '{nome_relatorio}' não foi gerado ou o caminho de retorno está incorreto/arquivo não existe. Não será incluído no e-mail.")
-            
-            # --- NOTA ---
-            # Se você ainda quisesse a opção de enviar e-mails individuais para ALGUNS relatórios,
-            # baseando-se numa flag no YAML (ex: enviar_individualmente: true), a lógica ficaria aqui:
-            #
-            # if def_relatorio.get('email', {}).get('enviar_individualmente', False):
-            #     email_config_para_relatorio = {
-            #         'destinatarios': def_relatorio.get('email', {}).get('destinatarios'),
-            #         'assunto': def_relatorio.get('email', {}).get('assunto'),
-            #         'corpo': def_relatorio.get('email', {}).get('corpo')
-            #     }
-            #     enviar_email_relatorio(
-            #         caminho_arquivo=caminho_relatorio_gerado,
-            #         definicao_email=email_config_para_relatorio,
-            #         destinatarios_globais=config.EMAIL_DESTINATARIOS,
-            #         data_referencia_relatorio=data_referencia 
-            #     )
-            # else:
-            #     logger.info(f"Envio de e-mail individual desabilitado para o relatório '{nome_relatorio}'.")
-
-        # --- FIM DO LOOP DE GERAÇÃO DE RELATÓRIOS ---
+                logger.info("Automação de relatórios concluída com sucesso para todos os pacotes!")
+            return
 
-        # 5. Enviar um ÚNICO E-MAIL com TODOS os relatórios gerados como anexos
-        if caminhos_relatorios_para_email_unico:
-            logger.info(f"Iniciando envio do e-mail consolidado com {len(caminhos_relatorios_para_email_unico)} relatórios anexados.")
-            
-            # Você pode definir um assunto e corpo padrão para o e-mail consolidado
-            # Ou, se quiser, pode pegar de uma nova seção no seu config.py ou report_definitions.yaml
-            assunto_consolidado = f"Relatórios Gerenciais Consolidados - {data_referencia.strftime('%B de %Y')}"
-            corpo_consolidado = f"""
-Prezados(as),
-
-Seguem em anexo os relatórios gerenciais consolidados para o período de **{data_referencia.strftime('%B de %Y')}**.
-
-Os relatórios incluídos são:
-{'- ' + '\\n- '.join([os.path.basename(p) for p in caminhos_relatorios_para_email_unico])}
-
-Esperamos que sejam úteis para sua análise.
-
-Atenciosamente,
-
-Equipe de Automação de Relatórios
-"""
-            # Chamar a nova função que envia múltiplos anexos
-            enviar_email_com_multiplos_anexos(
-                caminhos_arquivos=caminhos_relatorios_para_email_unico,
-                assunto=assunto_consolidado,
-                corpo=corpo_consolidado,
-                destinatarios=config.EMAIL_DESTINATARIOS, # Usa os destinatários globais do config.py
-                data_referencia_relatorio=data_referencia
-            )
-        else:
-            logger.warning("Nenhum relatório válido foi gerado para envio consolidado por e-mail.")
+        # 3. Carregar definições de relatórios
+        definicoes_relatorios = carregar_definicoes_relatorios()
+
+        # 4. Definir caminhos dos arquivos de entrada dinamicamente
+        caminhos_arquivos_entrada = montar_caminhos_entrada(config.CAMINHO_DADOS, data_referencia)
 
+        # Modo --explicar: lê apenas cabeçalhos e contagens de linhas, sem gerar nem enviar relatórios
+        if argumentos.explicar:
+            explicar_relatorios(definicoes_relatorios, caminhos_arquivos_entrada)
+            return
+
+        # Carregar os dados uma única vez e gerar todos os relatórios definidos
+        caminhos_relatorios_para_email_unico = executar_relatorios(
+            definicoes_relatorios,
+            caminhos_arquivos_entrada,
+            config.CAMINHO_RELATORIOS,
+            data_referencia
+        )
+
+        # 5. Enviar um ÚNICO E-MAIL com TODOS os relatórios gerados como anexos
+        enviar_relatorios_consolidados(
+            caminhos_relatorios_para_email_unico,
+            config.EMAIL_DESTINATARIOS, # Usa os destinatários globais do config.py
+            data_referencia
+        )
 
         logger.info("Automação de relatórios concluída com sucesso!")
 
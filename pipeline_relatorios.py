@@ -0,0 +1,140 @@
+# Caminho: Automação de Relatórios Empresariais/pipeline_relatorios.py
+
+import os
+import time
+import logging
+import datetime
+
+from processar_dados import carregar_dados
+from gerar_relatorio import gerar_relatorio
+from enviar_email import enviar_email_com_multiplos_anexos
+from explicar_relatorio import registrar_execucao, REGISTRO_CARREGAMENTO
+from utils import iniciar_medicao_memoria, medir_pico_etapa, memoria_residente_processo
+
+logger = logging.getLogger(__name__)
+
+def montar_caminhos_entrada(caminho_dados: str, data_referencia: datetime.date) -> dict[str, str]:
+    """Monta os caminhos dos arquivos de entrada do mês (padrão nome_ANO_MES.xlsx)."""
+    sufixo = f"{data_referencia.year:04d}_{data_referencia.month:02d}"
+    return {
+        'transacoes': os.path.join(caminho_dados, f'transacoes_{sufixo}.xlsx'),
+        'cadastros': os.path.join(caminho_dados, f'cadastros_{sufixo}.xlsx')
+    }
+
+def executar_relatorios(
+    definicoes_relatorios: dict,
+    caminhos_arquivos_entrada: dict,
+    caminho_relatorios: str,
+    data_referencia: datetime.date,
+    resumo: dict = None,
+    nome_pacote: str = None
+) -> list[str]:
+    """
+    Carrega os dados de entrada uma única vez, gera todos os relatórios definidos e
+    retorna os caminhos dos relatórios gerados com sucesso.
+
+    As linhas rejeitadas na validação vão para a subpasta 'quarentena' de caminho_relatorios.
+    Se 'resumo' for informado, recebe em 'validacao' as contagens de linhas lidas e rejeitadas.
+    'nome_pacote' identifica as execuções do agendador no histórico usado pelas estimativas.
+    """
+    # Carregar todos os DataFrames de entrada uma única vez, padronizá-los e validá-los
+    resumo_validacao = {}
+    medicao = iniciar_medicao_memoria()
+    inicio = time.perf_counter()
+    dataframes_carregados = carregar_dados(
+        caminhos_arquivos_entrada,
+        data_referencia=data_referencia,
+        caminho_quarentena=os.path.join(caminho_relatorios, 'quarentena'),
+        resumo_validacao=resumo_validacao
+    )
+    metricas_carregamento = {'celulas_entrada': int(sum(df.size for df in dataframes_carregados.values())), 'validacao': resumo_validacao}
+    pico_carregamento = medir_pico_etapa(medicao)
+    if pico_carregamento is not None:
+        # Memória do interpretador e bibliotecas antes da leitura e o pico da leitura (openpyxl + DataFrames) acima dela
+        metricas_carregamento['memoria_base_bytes'] = medicao['referencia']
+        metricas_carregamento['pico_memoria_etapa_bytes'] = pico_carregamento
+        # Memória que continua ocupada pelos DataFrames enquanto os relatórios rodam
+        memoria_residente = memoria_residente_processo()
+        if medicao['pico_zerado'] and memoria_residente is not None:
+            metricas_carregamento['memoria_retida_bytes'] = max(0, memoria_residente - medicao['referencia'])
+    registrar_execucao(REGISTRO_CARREGAMENTO, metricas_carregamento, time.perf_counter() - inicio, nome_pacote)
+    for nome_fonte, resumo_fonte in resumo_validacao.items():
+        motivos = f" Motivos: {resumo_fonte['por_motivo']}." if resumo_fonte['por_motivo'] else ""
+        logger.info(f"Validação de {nome_fonte}: {resumo_fonte['linhas_lidas']} linhas lidas, "
+                    f"{resumo_fonte['linhas_rejeitadas']} rejeitadas.{motivos}")
+    if resumo is not None:
+        resumo['validacao'] = resumo_validacao
+
+    # Lista para armazenar os caminhos dos relatórios que serão enviados em um único e-mail
+    caminhos_relatorios_gerados = []
+
+    # Iterar sobre as definições de relatórios e executá-los
+    for nome_relatorio, def_relatorio in definicoes_relatorios.items():
+        logger.info(f"Executando relatório: {nome_relatorio}.")
+
+        # Formatar o nome do arquivo de saída de forma consistente
+        # Substitui espaços por underscores e converte para minúsculas
+        nome_arquivo_base = f"{nome_relatorio.replace(' ', '_').lower()}_{data_referencia.year:04d}_{data_referencia.month:02d}.xlsx"
+        caminho_saida_relatorio = os.path.join(caminho_relatorios, nome_arquivo_base)
+
+        # CHAMA gerar_relatorio COM OS DATAFRAMES CARREGADOS E A DEFINIÇÃO COMPLETA DO RELATÓRIO
+        metricas_relatorio = {}
+        medicao = iniciar_medicao_memoria()
+        inicio = time.perf_counter()
+        caminho_relatorio_gerado = gerar_relatorio(
+            dataframes=dataframes_carregados,
+            definicao_relatorio=def_relatorio,
+            caminho_saida_relatorio=caminho_saida_relatorio,
+            metricas=metricas_relatorio
+        )
+        # Registra as métricas reais para calibrar as estimativas do modo --explicar
+        if metricas_relatorio:
+            pico_relatorio = medir_pico_etapa(medicao)
+            if pico_relatorio is not None:
+                # Pico do próprio relatório (junções, processamento e escrita do Excel) acima da memória no seu início
+                metricas_relatorio['pico_memoria_etapa_bytes'] = pico_relatorio
+            registrar_execucao(nome_relatorio, metricas_relatorio, time.perf_counter() - inicio, nome_pacote)
+
+        # Adiciona o caminho do relatório gerado à lista para envio consolidado
+        if caminho_relatorio_gerado and os.path.exists(caminho_relatorio_gerado):
+            caminhos_relatorios_gerados.append(caminho_relatorio_gerado)
+            logger.info(f"Relatório '{nome_relatorio}' adicionado à lista para envio consolidado.")
+        else:
+            logger.error(f"Relatório '{nome_relatorio}' não foi gerado ou o caminho de retorno está incorreto/arquivo não existe. Não será incluído no e-mail.")
+
+    return caminhos_relatorios_gerados
+
+def enviar_relatorios_consolidados(caminhos_relatorios: list[str], destinatarios: list, data_referencia: datetime.date) -> None:
+    """Envia um ÚNICO E-MAIL com TODOS os relatórios gerados como anexos."""
+    if not caminhos_relatorios:
+        logger.warning("Nenhum relatório válido foi gerado para envio consolidado por e-mail.")
+        return
+
+    logger.info(f"Iniciando envio do e-mail consolidado com {len(caminhos_relatorios)} relatórios anexados.")
+
+    # Você pode definir um assunto e corpo padrão para o e-mail consolidado
+    # Ou, se quiser, pode pegar de uma nova seção no seu config.py ou report_definitions.yaml
+    lista_relatorios = '- ' + '\n- '.join([os.path.basename(p) for p in caminhos_relatorios])
+    assunto_consolidado = f"Relatórios Gerenciais Consolidados - {data_referencia.strftime('%B de %Y')}"
+    corpo_consolidado = f"""
+Prezados(as),
+
+Seguem em anexo os relatórios gerenciais consolidados para o período de **{data_referencia.strftime('%B de %Y')}**.
+
+Os relatórios incluídos são:
+{lista_relatorios}
+
+Esperamos que sejam úteis para sua análise.
+
+Atenciosamente,
+
+Equipe de Automação de Relatórios
+"""
+    # Chamar a nova função que envia múltiplos anexos
+    enviar_email_com_multiplos_anexos(
+        caminhos_arquivos=caminhos_relatorios,
+        assunto=assunto_consolidado,
+        corpo=corpo_consolidado,
+        destinatarios=destinatarios,
+        data_referencia_relatorio=data_referencia
+    )
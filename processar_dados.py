@@ -1,71 +1,180 @@
 # Caminho: Automação de Relatórios Empresariais/processar_dados.py
 
 import pandas as pd
+import numpy as np
+import os
 import logging
-from config import COLUNAS_TRANSACOES, COLUNAS_CADASTROS
+import datetime
+from config import COLUNAS_TRANSACOES, COLUNAS_CADASTROS, REGRAS_VALIDACAO
 
 logger = logging.getLogger(__name__)
 
-def _padronizar_e_validar_colunas(df: pd.DataFrame, esperado: dict, nome_df: str) -> pd.DataFrame:
+# Mapeamento entre o nome de cada fonte de dados e os aliases de suas colunas lógicas
+MAPEAMENTO_COLUNAS = {
+    "transacoes": COLUNAS_TRANSACOES,
+    "cadastros": COLUNAS_CADASTROS,
+}
+
+def mapear_colunas_logicas(colunas, esperado: dict) -> dict[str, str]:
     """
-    Padroniza nomes de colunas, valida a presença de colunas essenciais,
-    e converte tipos de dados, se necessário.
+    Retorna o mapeamento {nome_em_minusculas_no_arquivo: coluna_logica} para as colunas
+    esperadas que foram encontradas. Colunas lógicas ausentes simplesmente não aparecem
+    no resultado (quem chama decide se isso é um erro).
     """
-    df_padronizado = df.copy()
+    colunas_minusculas = [str(col).lower() for col in colunas]
+    mapeamento = {}
+    for coluna_logica, aliases in esperado.items():
+        for alias in (alias.lower() for alias in aliases): # Garante que estamos comparando minúsculas com minúsculas
+            if alias in colunas_minusculas:
+                mapeamento[alias] = coluna_logica
+                break
+    return mapeamento
 
+def _padronizar_e_validar_colunas(df: pd.DataFrame, esperado: dict, nome_df: str) -> pd.DataFrame:
+    """
+    Padroniza nomes de colunas e valida a presença de colunas essenciais.
+    A conversão de tipos e a rejeição de linhas ficam em validar_dados.
+    """
     # Recomendação: Converta nomes das colunas do DataFrame para minúsculas
     # e coloque os aliases no config.py em minúsculas para robustez case-insensitive.
-    df_padronizado.columns = df_padronizado.columns.str.lower()
+    df_padronizado = df.rename(columns=lambda coluna: str(coluna).lower())
 
+    mapeamento = mapear_colunas_logicas(df_padronizado.columns, esperado)
     for coluna_logica, aliases in esperado.items():
-        encontrada = False
-        aliases_para_comparar = [alias.lower() for alias in aliases] # Garante que estamos comparando minúsculas com minúsculas
-
-        for alias in aliases_para_comparar:
-            if alias in df_padronizado.columns:
-                if alias != coluna_logica:
-                    df_padronizado = df_padronizado.rename(columns={alias: coluna_logica})
-                encontrada = True
-                logger.debug(f"Coluna '{coluna_logica}' mapeada para '{alias}' em {nome_df}.")
-                break
-        if not encontrada:
+        if coluna_logica not in mapeamento.values():
             raise KeyError(f"Coluna essencial '{coluna_logica}' (aliases: {aliases}) não encontrada no arquivo de {nome_df}.")
+        logger.debug(f"Coluna '{coluna_logica}' mapeada em {nome_df}.")
+    return df_padronizado.rename(columns=mapeamento)
 
-    # Exemplo de conversão de tipo:
-    if 'valor' in esperado and 'valor' in df_padronizado.columns:
-        try:
-            df_padronizado['valor'] = pd.to_numeric(df_padronizado['valor'], errors='coerce')
-            df_padronizado.dropna(subset=['valor'], inplace=True)
-            logger.debug(f"Coluna 'valor' convertida para numérica em {nome_df}.")
-        except Exception as e:
-            logger.error(f"Erro ao converter tipo da coluna 'valor' em {nome_df}: {e}", exc_info=True)
-            raise
+def _separar_nulos_e_invalidos(original: pd.Series, falhou_conversao: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Separa as linhas que falharam em uma verificação (conversão de tipo ou busca nos
+    cadastros) entre valores ausentes e inválidos.
+    Só as linhas que falharam são inspecionadas na coluna original.
+    """
+    nulo = np.zeros(len(original), dtype=bool)
+    if not falhou_conversao.any():
+        return nulo, falhou_conversao # Caso comum: nada a inspecionar
+    posicoes = np.flatnonzero(falhou_conversao)
+    nulo[posicoes] = original.iloc[posicoes].isna().to_numpy()
+    return nulo, falhou_conversao & ~nulo
 
-    # Convertendo a coluna 'data' para datetime, se presente e essencial
-    if 'data' in esperado and 'data' in df_padronizado.columns:
-        try:
-            df_padronizado['data'] = pd.to_datetime(df_padronizado['data'], errors='coerce')
-            df_padronizado.dropna(subset=['data'], inplace=True)
-            logger.debug(f"Coluna 'data' convertida para datetime em {nome_df}.")
-        except Exception as e:
-            logger.error(f"Erro ao converter tipo da coluna 'data' em {nome_df}: {e}", exc_info=True)
-            raise
+def validar_dados(
+    df: pd.DataFrame,
+    nome_fonte: str,
+    data_referencia: datetime.date = None,
+    chaves_cadastro: pd.Series = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Converte os tipos das colunas 'valor' e 'data' e aplica todas as regras de validação
+    de uma só vez: cada regra gera uma máscara booleana, as máscaras são combinadas e as
+    linhas são filtradas uma única vez.
+
+    Regras (as opcionais são ligadas/desligadas em REGRAS_VALIDACAO no config.py):
+      - cliente_nulo: chave 'cliente' ausente;
+      - valor_nulo / valor_invalido: 'valor' ausente ou não numérico;
+      - data_nula / data_invalida: 'data' ausente ou não reconhecida como data;
+      - valor_negativo: 'valor' menor que zero;
+      - fora_do_periodo: 'data' fora do mês de data_referencia (se informado);
+      - cliente_orfao: 'cliente' inexistente nos cadastros (se chaves_cadastro for informado).
 
-    return df_padronizado
+    Retorna (linhas válidas com tipos convertidos, linhas rejeitadas com os valores
+    originais e a coluna 'motivo_rejeicao').
+    """
+    regras = {}
+
+    cliente_orfao = None
+    if 'cliente' in df.columns:
+        if chaves_cadastro is not None and REGRAS_VALIDACAO.get('rejeitar_cliente_orfao', True):
+            # Uma única busca nos cadastros: clientes nulos também ficam de fora (as chaves validadas
+            # não têm nulos), então isna só é verificado nas linhas não encontradas
+            fora_dos_cadastros = ~df['cliente'].isin(chaves_cadastro).to_numpy()
+            regras['cliente_nulo'], cliente_orfao = _separar_nulos_e_invalidos(df['cliente'], fora_dos_cadastros)
+        else:
+            regras['cliente_nulo'] = df['cliente'].isna().to_numpy()
+
+    if 'valor' in df.columns:
+        # O read_excel já entrega colunas numéricas e de data tipadas; só convertemos quando não for o caso
+        valor = df['valor'] if pd.api.types.is_numeric_dtype(df['valor'].dtype) else pd.to_numeric(df['valor'], errors='coerce')
+        valor_nulo, valor_invalido = _separar_nulos_e_invalidos(df['valor'], valor.isna().to_numpy())
+        regras['valor_nulo'] = valor_nulo
+        regras['valor_invalido'] = valor_invalido
+        if REGRAS_VALIDACAO.get('rejeitar_valor_negativo', True):
+            regras['valor_negativo'] = (valor < 0).to_numpy()
+
+    if 'data' in df.columns:
+        data = df['data'] if pd.api.types.is_datetime64_dtype(df['data'].dtype) else pd.to_datetime(df['data'], errors='coerce')
+        data_nula, data_invalida = _separar_nulos_e_invalidos(df['data'], data.isna().to_numpy())
+        regras['data_nula'] = data_nula
+        regras['data_invalida'] = data_invalida
+        if data_referencia is not None and REGRAS_VALIDACAO.get('rejeitar_fora_do_periodo', True):
+            inicio_periodo = pd.Timestamp(data_referencia.year, data_referencia.month, 1)
+            fim_periodo = inicio_periodo + pd.offsets.MonthBegin(1)
+            # Datas nulas já são rejeitadas pelas regras acima; aqui só as válidas fora do mês
+            regras['fora_do_periodo'] = ((data < inicio_periodo) | (data >= fim_periodo)).to_numpy()
+
+    if cliente_orfao is not None:
+        regras['cliente_orfao'] = cliente_orfao
+
+    rejeitadas = np.zeros(len(df), dtype=bool)
+    for mascara in regras.values():
+        rejeitadas |= mascara
+
+    colunas_convertidas = {}
+    if 'valor' in df.columns and valor is not df['valor']:
+        colunas_convertidas['valor'] = valor
+    if 'data' in df.columns and data is not df['data']:
+        colunas_convertidas['data'] = data
+    df_convertido = df.assign(**colunas_convertidas) if colunas_convertidas else df
+    if not rejeitadas.any():
+        # Caso comum: nenhuma linha rejeitada, sem filtrar (copiar) o DataFrame nem montar motivos
+        return df_convertido, df.iloc[:0].assign(motivo_rejeicao=pd.Series(dtype=object))
+    df_valido = df_convertido[~rejeitadas]
+
+    # Os motivos são montados apenas para as linhas rejeitadas: cada combinação de regras
+    # violadas vira um inteiro (um bit por regra) e o texto é montado uma vez por combinação
+    nomes_regras = list(regras)
+    combinacoes = np.zeros(int(rejeitadas.sum()), dtype=np.int64)
+    for bit, mascara in enumerate(regras.values()):
+        combinacoes |= mascara[rejeitadas].astype(np.int64) << bit
+    combinacoes_unicas, posicoes = np.unique(combinacoes, return_inverse=True)
+    textos = np.array([';'.join(nome for bit, nome in enumerate(nomes_regras) if combinacao >> bit & 1)
+                       for combinacao in combinacoes_unicas], dtype=object)
+    df_rejeitado = df[rejeitadas].assign(motivo_rejeicao=textos[posicoes])
+
+    if len(df_rejeitado):
+        contagens = {nome_regra: int(mascara.sum()) for nome_regra, mascara in regras.items() if mascara.any()}
+        logger.warning(f"{len(df_rejeitado)} linha(s) rejeitada(s) em {nome_fonte}: {contagens}.")
+    return df_valido, df_rejeitado
 
-def carregar_dados(caminhos_arquivos: dict) -> dict[str, pd.DataFrame]:
+def _resumir_validacao(df_rejeitado: pd.DataFrame, total_linhas: int) -> dict:
+    """Contagens da validação de uma fonte para o resumo da execução."""
+    por_motivo = {}
+    if len(df_rejeitado):
+        por_motivo = df_rejeitado['motivo_rejeicao'].str.split(';').explode().value_counts().to_dict()
+    return {
+        'linhas_lidas': total_linhas,
+        'linhas_rejeitadas': len(df_rejeitado),
+        'por_motivo': {motivo: int(contagem) for motivo, contagem in por_motivo.items()},
+    }
+
+def carregar_dados(
+    caminhos_arquivos: dict,
+    data_referencia: datetime.date = None,
+    caminho_quarentena: str = None,
+    resumo_validacao: dict = None
+) -> dict[str, pd.DataFrame]:
     """
     Carrega, padroniza e valida os dados de arquivos Excel baseados nos caminhos fornecidos.
     Retorna um dicionário de DataFrames.
+
+    Linhas rejeitadas na validação são gravadas, com o motivo, em
+    'quarentena_<arquivo de origem>.xlsx' dentro de caminho_quarentena (se informado).
+    Se 'resumo_validacao' for informado, recebe as contagens de cada fonte.
     """
     dataframes = {}
     logger.info("Iniciando carregamento dos dados de entrada...")
 
-    mapeamento_colunas = {
-        "transacoes": COLUNAS_TRANSACOES,
-        "cadastros": COLUNAS_CADASTROS,
-    }
-
     for nome_fonte, caminho_arquivo in caminhos_arquivos.items():
         try:
             logger.info(f"Carregando {nome_fonte} de: {caminho_arquivo}")
@@ -76,7 +185,7 @@ def carregar_dados(caminhos_arquivos: dict) -> dict[str, pd.DataFrame]:
                 dataframes[nome_fonte] = pd.DataFrame()
                 continue
 
-            colunas_esperadas = mapeamento_colunas.get(nome_fonte)
+            colunas_esperadas = MAPEAMENTO_COLUNAS.get(nome_fonte)
             if colunas_esperadas:
                 df_padronizado = _padronizar_e_validar_colunas(df, colunas_esperadas, nome_fonte)
                 dataframes[nome_fonte] = df_padronizado
@@ -97,6 +206,34 @@ def carregar_dados(caminhos_arquivos: dict) -> dict[str, pd.DataFrame]:
         except Exception as e:
             logger.error(f"Erro inesperado ao carregar os dados de {nome_fonte}: {e}", exc_info=True)
             raise
+
+    # Validação: os cadastros primeiro, pois suas chaves são usadas para detectar clientes órfãos
+    chaves_cadastro = None
+    for nome_fonte in sorted(dataframes, key=lambda nome: nome != 'cadastros'):
+        df = dataframes[nome_fonte]
+        if df.empty or nome_fonte not in MAPEAMENTO_COLUNAS:
+            continue
+
+        df_valido, df_rejeitado = validar_dados(
+            df,
+            nome_fonte,
+            data_referencia=data_referencia,
+            chaves_cadastro=chaves_cadastro if nome_fonte != 'cadastros' else None
+        )
+        dataframes[nome_fonte] = df_valido
+        if nome_fonte == 'cadastros' and not df_valido.empty:
+            chaves_cadastro = df_valido['cliente'].unique()
+
+        resumo_fonte = _resumir_validacao(df_rejeitado, len(df))
+        if caminho_quarentena and len(df_rejeitado):
+            os.makedirs(caminho_quarentena, exist_ok=True)
+            nome_arquivo = os.path.basename(caminhos_arquivos[nome_fonte])
+            caminho_arquivo_quarentena = os.path.join(caminho_quarentena, f"quarentena_{os.path.splitext(nome_arquivo)[0]}.xlsx")
+            df_rejeitado.to_excel(caminho_arquivo_quarentena, index=False)
+            resumo_fonte['arquivo_quarentena'] = caminho_arquivo_quarentena
+            logger.warning(f"Linhas rejeitadas de {nome_fonte} gravadas em quarentena: {caminho_arquivo_quarentena}")
+        if resumo_validacao is not None:
+            resumo_validacao[nome_fonte] = resumo_fonte
     
     # Esta verificação é importante, pois 'transacoes' é a base da maioria dos relatórios
     if dataframes.get("transacoes", pd.DataFrame()).empty:
@@ -104,4 +241,3 @@ def carregar_dados(caminhos_arquivos: dict) -> dict[str, pd.DataFrame]:
     
     logger.info("Todos os dados de entrada carregados, padronizados e validados com sucesso!")
     return dataframes
-
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gerar_relatorio import gerar_relatorio
+
+
+def _definicao(agrupar_por: list[str], janela: int) -> dict:
+    return {
+        'fontes_dados': [{'nome': 'transacoes'}],
+        'processamento_relatorio': {
+            'agrupar_por': agrupar_por,
+            'agregacoes': {'valor_total': {'coluna_origem': 'valor', 'funcao': 'sum'}},
+            'acumulados': {'soma_movel': {'coluna_origem': 'valor_total', 'funcao': 'sum', 'janela': janela}},
+        },
+    }
+
+
+def test_janela_movel_conta_periodos_e_nao_linhas(tmp_path):
+    # O cliente A não tem vendas entre 2005-01-10 e 2005-03-07: a janela de 2 semanas
+    # de 2005-03-07 não pode alcançar a semana de 2005-01-10
+    transacoes = pd.DataFrame({
+        'cliente': ['A', 'A', 'A', 'B', 'B'],
+        'valor': [10.0, 20.0, 30.0, 5.0, 7.0],
+        'data': pd.to_datetime(['2005-01-03', '2005-01-10', '2005-03-07', '2005-01-04', '2005-01-12']),
+    })
+    caminho_saida = gerar_relatorio({'transacoes': transacoes}, _definicao(['cliente', 'data:semana'], 2), str(tmp_path / 'relatorio.xlsx'))
+
+    relatorio = pd.read_excel(caminho_saida)
+    assert relatorio['cliente'].tolist() == ['A', 'A', 'A', 'B', 'B']
+    assert relatorio['data_semana'].tolist() == list(pd.to_datetime(['2005-01-03', '2005-01-10', '2005-03-07', '2005-01-03', '2005-01-10']))
+    assert relatorio['soma_movel'].tolist() == [10, 30, 30, 5, 12]
+
+
+def test_janela_movel_mensal_com_mes_sem_dados(tmp_path):
+    transacoes = pd.DataFrame({
+        'cliente': ['A', 'A', 'A'],
+        'valor': [10.0, 20.0, 40.0],
+        'data': pd.to_datetime(['2005-01-15', '2005-03-02', '2005-04-20']),
+    })
+    caminho_saida = gerar_relatorio({'transacoes': transacoes}, _definicao(['data:mes'], 2), str(tmp_path / 'relatorio.xlsx'))
+
+    relatorio = pd.read_excel(caminho_saida)
+    # Fevereiro não tem vendas: a janela de março (fev + mar) não inclui janeiro
+    assert relatorio['soma_movel'].tolist() == [10, 20, 60]
@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agendador import _ordem_execucao, _reserva_cabeca_fila
+
+MB = 1024 * 1024
+
+
+def _pacote(nome: str, prioridade: int = 0, prazo: datetime.datetime = None, memoria: int = 100 * MB, segundos: float = 60.0) -> dict:
+    return {'nome': nome, 'prioridade': prioridade, 'prazo': prazo, 'memoria_estimada': memoria, 'segundos_estimados': segundos}
+
+
+def test_prazo_em_risco_passa_a_frente_da_prioridade():
+    agora = datetime.datetime(2025, 7, 5, 8, 0)
+    pacotes = [
+        _pacote('importante', prioridade=10),
+        _pacote('folgado', prioridade=1, prazo=agora + datetime.timedelta(hours=2)),
+        _pacote('apertado', prioridade=1, prazo=agora + datetime.timedelta(seconds=30)),
+        _pacote('vencido', prioridade=0, prazo=agora - datetime.timedelta(minutes=5)),
+    ]
+    ordem = sorted(pacotes, key=lambda pacote: _ordem_execucao(pacote, agora))
+    assert [pacote['nome'] for pacote in ordem] == ['vencido', 'apertado', 'importante', 'folgado']
+
+
+def test_reserva_da_cabeca_considera_termino_previsto():
+    inicio = time.perf_counter()
+    em_execucao = {
+        1: (None, None, _pacote('curto', memoria=300 * MB, segundos=10), inicio),
+        2: (None, None, _pacote('longo', memoria=300 * MB, segundos=100), inicio),
+    }
+    cabeca = _pacote('cabeca', memoria=500 * MB)
+
+    instante, sobra = _reserva_cabeca_fila(cabeca, em_execucao, 1000 * MB, 600 * MB)
+
+    # Basta o término do pacote curto para liberar memória suficiente para a cabeça
+    assert instante == inicio + 10
+    assert sobra == 200 * MB
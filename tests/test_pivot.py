@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gerar_relatorio import _gerar_pivot
+
+
+def _transacoes(n_linhas: int, n_clientes: int, semente: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    valor = rng.integers(1, 100, n_linhas).astype(float)
+    valor[rng.random(n_linhas) < 0.1] = np.nan
+    return pd.DataFrame({
+        'cliente': [f"c{c:03d}" for c in rng.integers(0, n_clientes, n_linhas)],
+        'produto': rng.choice(['A', 'B', 'C'], n_linhas),
+        'valor': valor,
+        'data': pd.Timestamp('2005-01-01') + pd.to_timedelta(rng.integers(0, 90, n_linhas), unit='D'),
+    })
+
+
+# Poucos clientes dão uma matriz densa; muitos clientes x dias, uma matriz esparsa
+@pytest.mark.parametrize('n_clientes, colunas', [(5, 'produto'), (300, 'data:dia')])
+@pytest.mark.parametrize('funcao', ['sum', 'count', 'mean', 'max', 'min'])
+def test_pivot_igual_ao_pivot_table(n_clientes, colunas, funcao):
+    df = _transacoes(2000, n_clientes)
+    resultado = _gerar_pivot(df, {'linhas': 'cliente', 'colunas': colunas, 'valores': 'valor', 'funcao': funcao})
+
+    coluna_origem = colunas.split(':')[0]
+    esperado = df.pivot_table(index='cliente', columns=coluna_origem, values='valor', aggfunc=funcao, dropna=False)
+    if funcao == 'count':
+        # Como no groupby: 0 nas células só com valores nulos e vazia nas células sem nenhuma linha
+        linhas_por_celula = df.pivot_table(index='cliente', columns=coluna_origem, aggfunc='size', fill_value=0)
+        esperado = esperado.where(linhas_por_celula.reindex_like(esperado).fillna(0) > 0)
+    esperado.columns = [c.strftime('%Y-%m-%d') if isinstance(c, pd.Timestamp) else str(c) for c in esperado.columns]
+
+    assert resultado['cliente'].tolist() == esperado.index.tolist()
+    obtido = np.column_stack([np.asarray(resultado[c], dtype=float) for c in esperado.columns])
+    np.testing.assert_allclose(obtido, esperado.to_numpy(dtype=float), equal_nan=True)
+
+
+def test_pivot_cabecalhos_de_tempo_pela_granularidade():
+    df = _transacoes(500, 4)
+    mensal = _gerar_pivot(df, {'linhas': 'cliente', 'colunas': 'data:mes', 'valores': 'valor'})
+    assert list(mensal.columns) == ['cliente', '2005-01', '2005-02', '2005-03']
+
+    por_produto_e_ano = _gerar_pivot(df, {'linhas': 'cliente', 'colunas': ['produto', 'data:ano'], 'valores': 'valor'})
+    assert list(por_produto_e_ano.columns) == ['cliente', 'A / 2005', 'B / 2005', 'C / 2005']
+
+
+def test_pivot_totais_e_colunas_com_nome_reservado():
+    df = pd.DataFrame({
+        'cliente': ['x', 'x', 'y', None],
+        'produto': ['Total', 'cliente', 'Total', 'Total'],
+        'valor': [1.0, 2.0, 4.0, 8.0],
+    })
+    resultado = _gerar_pivot(df, {'linhas': 'cliente', 'colunas': 'produto', 'valores': 'valor', 'totais': True})
+
+    # A linha com cliente nulo fica fora da matriz
+    assert list(resultado.columns) == ['cliente', 'Total (produto)', 'cliente (produto)', 'Total']
+    assert resultado['cliente'].tolist() == ['x', 'y', 'Total']
+    assert resultado['Total'].tolist() == [3.0, 4.0, 7.0]
+    assert np.asarray(resultado['Total (produto)'], dtype=float).tolist() == [1.0, 4.0, 5.0]
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gerar_relatorio import _selecionar_top_n
+
+
+def _referencia(df: pd.DataFrame, coluna: str, por_grupo: list[str], limite: int, ascendente: bool) -> pd.DataFrame:
+    posicoes = df.groupby(por_grupo, dropna=False)[coluna].rank(method='first', ascending=ascendente)
+    mascara = posicoes.notna() & (posicoes <= limite)
+    return df[mascara].assign(rank=posicoes[mascara].astype('int64')).sort_values(por_grupo + ['rank'])
+
+
+def _dados(n_linhas: int, n_grupos: int, semente: int) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    grupo = pd.Series(rng.integers(0, n_grupos, n_linhas)).map(lambda g: f"g{g:03d}").astype(object)
+    grupo[rng.random(n_linhas) < 0.05] = None # Chaves de grupo nulas
+    valor = rng.integers(0, 20, n_linhas).astype(float) # Muitos empates
+    valor[rng.random(n_linhas) < 0.1] = np.nan
+    return pd.DataFrame({'grupo': grupo, 'valor': valor, 'id': np.arange(n_linhas)})
+
+
+# Poucos grupos grandes usam a seleção parcial; muitos grupos pequenos, a ordenação completa
+@pytest.mark.parametrize('n_grupos', [3, 400])
+@pytest.mark.parametrize('ascendente', [False, True])
+@pytest.mark.parametrize('limite', [0, 1, 4])
+def test_top_n_por_grupo_igual_ao_rank_first(n_grupos, ascendente, limite):
+    df = _dados(2000, n_grupos, semente=n_grupos + limite)
+    config = {'coluna': 'valor', 'limite': limite, 'ascendente': ascendente, 'por_grupo': ['grupo'], 'coluna_rank': 'rank'}
+
+    resultado = _selecionar_top_n(df, config)
+    esperado = _referencia(df, 'valor', ['grupo'], limite, ascendente)
+
+    assert resultado['id'].tolist() == esperado['id'].tolist()
+    assert resultado['rank'].tolist() == esperado['rank'].tolist()
+
+
+def test_top_n_global_coluna_texto():
+    df = pd.DataFrame({'nome': pd.array(['b', 'a', None, 'c', 'a'], dtype='str'), 'id': range(5)})
+
+    resultado = _selecionar_top_n(df, {'coluna': 'nome', 'limite': 2, 'coluna_rank': 'rank'})
+
+    assert resultado['id'].tolist() == [3, 0]
+    assert resultado['rank'].tolist() == [1, 2]
+
+
+def test_top_n_coluna_nao_ordenavel_e_ignorado():
+    df = pd.DataFrame({'misto': pd.array(['b', 1, 'c'], dtype=object)})
+
+    assert _selecionar_top_n(df, {'coluna': 'misto', 'limite': 2}) is df
@@ -0,0 +1,70 @@
+import os
+import sys
+import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processar_dados import validar_dados, carregar_dados
+
+
+def test_motivos_de_rejeicao():
+    transacoes = pd.DataFrame({
+        'cliente': ['C1', None, 'C9', 'C1', 'C1', 'C1', 'C2', 'C1'],
+        'valor': ['10', '5', '7', 'abc', None, '-3', '8', '-1'],
+        'data': ['2005-02-10', '2005-02-11', '2005-02-12', '2005-02-13', '2005-02-14', '2005-03-01', 'ontem', None],
+    })
+
+    df_valido, df_rejeitado = validar_dados(transacoes, 'transacoes', datetime.date(2005, 2, 1), pd.Series(['C1', 'C2']))
+
+    assert df_valido.index.tolist() == [0]
+    assert df_valido['valor'].tolist() == [10.0]
+    assert df_valido['data'].tolist() == [pd.Timestamp('2005-02-10')]
+    assert df_rejeitado['motivo_rejeicao'].tolist() == [
+        'cliente_nulo',
+        'cliente_orfao',
+        'valor_invalido',
+        'valor_nulo',
+        'valor_negativo;fora_do_periodo',
+        'data_invalida',
+        'valor_negativo;data_nula',
+    ]
+    # As linhas rejeitadas mantêm os valores originais
+    assert df_rejeitado['valor'].fillna('').tolist() == ['5', '7', 'abc', '', '-3', '8', '-1']
+
+
+def test_sem_rejeicoes_mantem_colunas_tipadas():
+    transacoes = pd.DataFrame({
+        'cliente': ['C1', 'C2'],
+        'valor': [1.5, 2.0],
+        'data': pd.to_datetime(['2005-02-01', '2005-02-28']),
+    })
+
+    df_valido, df_rejeitado = validar_dados(transacoes, 'transacoes', datetime.date(2005, 2, 1), pd.Series(['C1', 'C2']))
+
+    pd.testing.assert_frame_equal(df_valido, transacoes)
+    assert df_rejeitado.empty
+    assert 'motivo_rejeicao' in df_rejeitado.columns
+
+
+def test_carregar_dados_grava_quarentena(tmp_path):
+    pd.DataFrame({'ID Cliente': ['C1', 'C2'], 'Nome': ['Ana', 'Bia'], 'Segmento': ['A', 'B']}).to_excel(tmp_path / 'cadastros_2005_02.xlsx', index=False)
+    pd.DataFrame({
+        'ID Cliente': ['C1', 'C3', 'C2'],
+        'Valor Venda': [10.0, 20.0, -5.0],
+        'Data Venda': pd.to_datetime(['2005-02-01', '2005-02-02', '2005-02-03']),
+    }).to_excel(tmp_path / 'transacoes_2005_02.xlsx', index=False)
+    caminhos = {'transacoes': str(tmp_path / 'transacoes_2005_02.xlsx'), 'cadastros': str(tmp_path / 'cadastros_2005_02.xlsx')}
+    resumo = {}
+
+    dataframes = carregar_dados(caminhos, datetime.date(2005, 2, 1), caminho_quarentena=str(tmp_path / 'quarentena'), resumo_validacao=resumo)
+
+    assert dataframes['transacoes']['cliente'].tolist() == ['C1']
+    assert resumo['transacoes']['linhas_rejeitadas'] == 2
+    assert resumo['transacoes']['por_motivo'] == {'cliente_orfao': 1, 'valor_negativo': 1}
+    assert 'arquivo_quarentena' not in resumo['cadastros']
+    quarentena = pd.read_excel(resumo['transacoes']['arquivo_quarentena'])
+    assert os.path.basename(resumo['transacoes']['arquivo_quarentena']) == 'quarentena_transacoes_2005_02.xlsx'
+    assert quarentena['cliente'].tolist() == ['C3', 'C2']
+    assert quarentena['motivo_rejeicao'].tolist() == ['cliente_orfao', 'valor_negativo']
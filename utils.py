@@ -1,9 +1,17 @@
 # Caminho: Automação de Relatórios Empresariais/utils.py
 
 import os
+import sys
+import gc
+import ctypes
 import logging
 import yaml # NOVO IMPORT
 
+try:
+    import resource # Disponível apenas em sistemas Unix (Linux/macOS)
+except ImportError:
+    resource = None
+
 # Importa as variáveis em maiúsculas (ALL_CAPS) do config.py
 from config import LOG_FILE, LOG_LEVEL, LOG_FORMAT, CAMINHO_DADOS, CAMINHO_RELATORIOS, CAMINHO_DEFINICOES_RELATORIOS
 
@@ -33,17 +41,90 @@ def ensure_directories_exist():
     os.makedirs(os.path.dirname(CAMINHO_DEFINICOES_RELATORIOS), exist_ok=True)
     logger.info("Diretórios verificados/criados com sucesso.")
 
+# Maior pico de RSS já observado; necessário porque zerar o pico no Linux também zera o ru_maxrss
+_maior_pico_observado = 0
+
+def _ler_memoria_linux() -> dict[str, int] | None:
+    """Memória residente atual (VmRSS) e pico (VmHWM) do processo em bytes, lidos de /proc (só Linux)."""
+    try:
+        with open('/proc/self/status', 'r') as file:
+            campos = dict(linha.split(':', 1) for linha in file if linha.startswith(('VmRSS', 'VmHWM')))
+        return {campo: int(valor.split()[0]) * 1024 for campo, valor in campos.items()}
+    except (OSError, ValueError):
+        return None
+
+def pico_memoria_processo() -> int | None:
+    """
+    Maior pico de memória residente (RSS) do processo atual até agora, em bytes.
+    Retorna None onde a medição não está disponível (ex.: Windows).
+    """
+    global _maior_pico_observado
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    _maior_pico_observado = max(_maior_pico_observado, pico if sys.platform == 'darwin' else pico * 1024)
+    return _maior_pico_observado
+
+def memoria_residente_processo() -> int | None:
+    """Memória residente (RSS) atual do processo em bytes; None fora do Linux."""
+    memoria = _ler_memoria_linux()
+    return memoria['VmRSS'] if memoria else None
+
+def iniciar_medicao_memoria() -> dict | None:
+    """
+    Marca o início de uma etapa para medir o pico de memória da própria etapa.
+    No Linux, zera o pico de RSS do processo (escrevendo 5 em /proc/self/clear_refs), de modo que
+    cada etapa é medida isoladamente, independente das etapas anteriores. Nos demais sistemas,
+    guarda o pico acumulado (ru_maxrss), que só permite medir etapas que superem as anteriores.
+    """
+    pico_acumulado = pico_memoria_processo() # Registra o pico até aqui antes de zerá-lo
+    if _ler_memoria_linux() is not None:
+        # Devolve ao sistema a memória liberada pelas etapas anteriores; sem isso, uma etapa reaproveita
+        # páginas já residentes e seu pico parece menor quando roda depois de uma etapa pesada
+        gc.collect()
+        try:
+            ctypes.CDLL('libc.so.6').malloc_trim(0)
+        except (OSError, AttributeError):
+            pass # Linux sem glibc (ex.: musl)
+        try:
+            with open('/proc/self/clear_refs', 'w') as file:
+                file.write('5')
+            return {'referencia': _ler_memoria_linux()['VmRSS'], 'pico_zerado': True}
+        except OSError:
+            pass # Kernel sem suporte ou sem permissão: usa o pico acumulado
+    return None if pico_acumulado is None else {'referencia': pico_acumulado, 'pico_zerado': False}
+
+def medir_pico_etapa(inicio: dict | None) -> int | None:
+    """
+    Quanto o pico de memória da etapa iniciada em iniciar_medicao_memoria superou a memória
+    residente no início dela, em bytes. Retorna None quando não é possível medir a etapa:
+    sem suporte, ou quando o pico não pôde ser zerado e a etapa não superou as anteriores.
+    """
+    global _maior_pico_observado
+    if inicio is None:
+        return None
+    if inicio['pico_zerado']:
+        pico_etapa = _ler_memoria_linux()['VmHWM']
+        _maior_pico_observado = max(_maior_pico_observado, pico_etapa)
+        return max(pico_etapa - inicio['referencia'], 0)
+    acrescimo = pico_memoria_processo() - inicio['referencia']
+    return acrescimo or None
+
 # --- NOVA FUNÇÃO PARA CARREGAR DEFINIÇÕES DE RELATÓRIOS ---
-def carregar_definicoes_relatorios() -> dict:
-    """Carrega as definições de relatórios do arquivo YAML."""
-    if not os.path.exists(CAMINHO_DEFINICOES_RELATORIOS):
-        logger.error(f"Arquivo de definições de relatórios não encontrado: {CAMINHO_DEFINICOES_RELATORIOS}")
-        raise FileNotFoundError(f"Arquivo de definições de relatórios não encontrado: {CAMINHO_DEFINICOES_RELATORIOS}")
+def carregar_definicoes_relatorios(caminho_definicoes: str = CAMINHO_DEFINICOES_RELATORIOS) -> dict:
+    """
+    Carrega as definições de relatórios do arquivo YAML.
+    Por padrão usa o arquivo do config.py; cada pacote do agendador pode informar o seu.
+    """
+    if not os.path.exists(caminho_definicoes):
+        logger.error(f"Arquivo de definições de relatórios não encontrado: {caminho_definicoes}")
+        raise FileNotFoundError(f"Arquivo de definições de relatórios não encontrado: {caminho_definicoes}")
     
     try:
-        with open(CAMINHO_DEFINICOES_RELATORIOS, 'r', encoding='utf-8') as file:
+        with open(caminho_definicoes, 'r', encoding='utf-8') as file:
             definicoes = yaml.safe_load(file)
-        logger.info(f"Definições de relatórios carregadas com sucesso de: {CAMINHO_DEFINICOES_RELATORIOS}")
+        logger.info(f"Definições de relatórios carregadas com sucesso de: {caminho_definicoes}")
         return definicoes
     except yaml.YAMLError as e:
         logger.critical(f"Erro ao analisar o arquivo YAML de definições de relatórios: {e}", exc_info=True)